@@ -0,0 +1,40 @@
+"""
+Stored pages of a document
+Reprocessing replaces a document's pages, and deleting a document removes
+them; both go through here so OCR/LLM rows and near-duplicate links to the
+pages are cleaned up the same way from the API and from Celery workers.
+"""
+
+import os
+from models import Document, DocumentPage, OCRResult, LLMResult
+from page_dedup import release_pages
+
+def remove_page_files(paths):
+    """Delete rendered/preprocessed page images; a file already gone is not an error"""
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"Failed to remove page file {path}: {e}")
+
+def delete_document_pages(db, document_id: int) -> int:
+    """Delete a document's pages with their OCR and LLM results (not committed) and their page images
+
+    The images are derived from the upload (a single-page upload is its own page
+    image and is kept), so they are removed straight away: a rolled-back delete
+    only costs re-rendering them.
+    """
+    pages = db.query(DocumentPage.id, DocumentPage.image_path, DocumentPage.preprocessed_path).filter(
+        DocumentPage.document_id == document_id).all()
+    if not pages:
+        return 0
+    page_ids = [page.id for page in pages]
+    upload = db.query(Document.file_path).filter(Document.id == document_id).scalar()
+    release_pages(db, page_ids)
+    db.query(OCRResult).filter(OCRResult.page_id.in_(page_ids)).delete(synchronize_session=False)
+    db.query(LLMResult).filter(LLMResult.page_id.in_(page_ids)).delete(synchronize_session=False)
+    db.query(DocumentPage).filter(DocumentPage.id.in_(page_ids)).delete(synchronize_session=False)
+    remove_page_files({path for page in pages for path in (page.image_path, page.preprocessed_path)
+                       if path and path != upload})
+    return len(page_ids)
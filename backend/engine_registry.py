@@ -0,0 +1,107 @@
+"""
+Process-wide OCR and LLM engine instances
+Models are loaded once per process (at startup or lazily on first use) and
+shared by the API routes and the Celery workers.
+"""
+
+import os
+import time
+import threading
+from typing import Dict, Callable
+
+# Load models during server/worker startup instead of on the first request
+OCR_WARMUP_ON_STARTUP = os.getenv('OCR_WARMUP_ON_STARTUP', 'true').lower() == 'true'
+
+_lock = threading.Lock()
+_instances = {}
+_status = {}
+
+def _get_or_create(name: str, factory: Callable):
+    """Return the shared instance for name, constructing it once"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        if name in _instances:
+            return _instances[name]
+
+        _status[name] = {'state': 'loading', 'load_time': None, 'error': None}
+        start_time = time.time()
+        try:
+            instance = factory()
+        except Exception as e:
+            _status[name] = {'state': 'failed', 'load_time': None, 'error': str(e)}
+            print(f"Engine load error ({name}): {e}")
+            raise
+
+        _instances[name] = instance
+        _status[name] = {
+            'state': 'ready',
+            'load_time': round(time.time() - start_time, 3),
+            'error': None
+        }
+        return instance
+
+def _create_ocr_engine():
+    from ocr_engines import OCREngine
+    return OCREngine()
+
+def _create_llm_processor():
+    from llm_processor import LLMProcessor
+    return LLMProcessor()
+
+def get_ocr_engine():
+    """Get the process-wide OCREngine (models loaded on first use)"""
+    return _get_or_create('ocr', _create_ocr_engine)
+
+def get_llm_processor():
+    """Get the process-wide LLMProcessor"""
+    return _get_or_create('llm', _create_llm_processor)
+
+def warm_up() -> Dict:
+    """Load all engines and run a tiny inference so the first request is fast"""
+    try:
+        import numpy as np
+        ocr_engine = get_ocr_engine()
+        # First ONNX Runtime call allocates its arenas; do it now
+        ocr_engine.rapid_ocr(np.full((32, 32, 3), 255, dtype=np.uint8))
+        get_llm_processor()
+    except Exception as e:
+        print(f"Engine warm-up error: {e}")
+    return get_engine_status()
+
+def _stuck_engine_calls() -> int:
+    # ocr_engines is already imported once an OCR engine exists
+    from ocr_engines import stuck_engine_calls
+    return stuck_engine_calls()
+
+def get_engine_status() -> Dict:
+    """Report load state of each engine"""
+    engines = {}
+    for name in ('ocr', 'llm'):
+        engines[name] = dict(_status.get(name, {'state': 'not_loaded', 'load_time': None, 'error': None}))
+
+    from ocr_cache import get_ocr_cache
+    from ocr_router import describe_engines
+    from ocr_spatial import get_spatial_cache
+    cache = get_ocr_cache()
+    ocr_engine = _instances.get('ocr')
+    llm_processor = _instances.get('llm')
+    batcher = getattr(ocr_engine, 'rapid_batcher', None)
+
+    return {
+        'ready': all(e['state'] == 'ready' for e in engines.values()),
+        'pid': os.getpid(),
+        'engines': engines,
+        'ocr_cache': cache.stats() if cache is not None else None,
+        'spatial_index_cache': get_spatial_cache().stats(),
+        'ollama_client': llm_processor.ollama.stats() if llm_processor is not None else None,
+        'rapidocr_batching': batcher.stats() if batcher is not None else None,
+        'ocr_routing': {
+            'engines': describe_engines(),
+            'stats': ocr_engine.engine_stats.snapshot() if ocr_engine is not None else {},
+            'stuck_engine_calls': _stuck_engine_calls() if ocr_engine is not None else 0
+        },
+        'paddleocr': ocr_engine.paddle.stats() if ocr_engine is not None else None
+    }
@@ -0,0 +1,280 @@
+"""
+Header-level image inspection and frame-by-frame decoding
+Uploads are identified from their leading bytes and headers (true format,
+dimensions, page count) without decoding pixel data. Multi-page TIFFs are read
+through a memory-mapped file: the IFD chain is walked straight from the
+mapping and each page is decoded on its own, so a long G4 scan batch never
+sits in heap memory all at once.
+"""
+
+import os
+import mmap
+import struct
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image, TiffImagePlugin
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# Stored extension and MIME type per detected format
+FORMATS = {
+    'pdf': ('.pdf', 'application/pdf'),
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'png': ('.png', 'image/png'),
+    'tiff': ('.tiff', 'image/tiff')
+}
+
+# Baseline tags read while walking the IFD chain
+TAG_NEW_SUBFILE_TYPE = 254
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_COMPRESSION = 259
+# Field types that hold a SHORT/LONG/LONG8 value inline
+_INLINE_FORMATS = {3: 'H', 4: 'I', 16: 'Q'}
+
+def is_tiff(file_path: str) -> bool:
+    return file_path.lower().endswith(TIFF_EXTENSIONS)
+
+def _walk_ifds(buf) -> List[Dict]:
+    """Every IFD in the main chain with its size tags, read from the header bytes only"""
+    if len(buf) < 8 or buf[:2] not in (b'II', b'MM'):
+        raise Exception("Not a TIFF file")
+    order = '<' if buf[:2] == b'II' else '>'
+    version = struct.unpack_from(f'{order}H', buf, 2)[0]
+    if version == 42:
+        offset = struct.unpack_from(f'{order}I', buf, 4)[0]
+        count_format, entry_size, offset_format = 'H', 12, 'I'
+    elif version == 43:
+        # BigTIFF: 8-byte offsets and entry counts
+        offset = struct.unpack_from(f'{order}Q', buf, 8)[0]
+        count_format, entry_size, offset_format = 'Q', 20, 'Q'
+    else:
+        raise Exception(f"Unsupported TIFF version {version}")
+    count_size = struct.calcsize(count_format)
+    value_offset = 8 if version == 42 else 12
+
+    ifds, seen = [], set()
+    while offset and offset not in seen and offset + count_size <= len(buf):
+        seen.add(offset)
+        entries = struct.unpack_from(f'{order}{count_format}', buf, offset)[0]
+        end = offset + count_size + entries * entry_size
+        if end + struct.calcsize(offset_format) > len(buf):
+            break
+
+        tags = {}
+        for i in range(entries):
+            entry = offset + count_size + i * entry_size
+            tag, field_type = struct.unpack_from(f'{order}HH', buf, entry)
+            if tag in (TAG_NEW_SUBFILE_TYPE, TAG_IMAGE_WIDTH, TAG_IMAGE_LENGTH, TAG_COMPRESSION) \
+                    and field_type in _INLINE_FORMATS:
+                tags[tag] = struct.unpack_from(f'{order}{_INLINE_FORMATS[field_type]}', buf, entry + value_offset)[0]
+        ifds.append({
+            'index': len(ifds),
+            'width': tags.get(TAG_IMAGE_WIDTH, 0),
+            'height': tags.get(TAG_IMAGE_LENGTH, 0),
+            'compression': tags.get(TAG_COMPRESSION, 1),
+            'subfile_type': tags.get(TAG_NEW_SUBFILE_TYPE, 0)
+        })
+        offset = struct.unpack_from(f'{order}{offset_format}', buf, end)[0]
+    return ifds
+
+def _pages(ifds: List[Dict]) -> List[Dict]:
+    """Full-resolution pages: scanners may add reduced-resolution thumbnails to the chain"""
+    return [ifd for ifd in ifds if not ifd['subfile_type'] & 1] or ifds[:1]
+
+class MappedTiff:
+    """A TIFF file mapped read-only into memory, decoded one page at a time"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._image = None
+        self.pages = _pages(_walk_ifds(self._map))
+
+    def __enter__(self) -> 'MappedTiff':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def page_size(self, page_number: int) -> Tuple[int, int]:
+        page = self.pages[page_number - 1]
+        return page['width'], page['height']
+
+    def frame(self, page_number: int) -> Image.Image:
+        """PIL image positioned on a page (valid until the next call)"""
+        if not 1 <= page_number <= len(self.pages):
+            raise Exception(f"TIFF page {page_number} out of range (1-{len(self.pages)})")
+        if self._image is None:
+            # PIL reads strips through the mapping; only this frame's data is copied out
+            self._image = Image.open(self._map)
+        self._image.seek(self.pages[page_number - 1]['index'])
+        return self._image
+
+    def read_page(self, page_number: int, grayscale: bool = False) -> np.ndarray:
+        """Decode one page to a BGR (or grayscale) array"""
+        frame = self.frame(page_number)
+        if grayscale or frame.mode in ('1', 'L', 'I;16'):
+            gray = np.asarray(frame.convert('L'))
+            return gray if grayscale else cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        return cv2.cvtColor(np.asarray(frame.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    def close(self):
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        self._map.close()
+        self._file.close()
+
+def tiff_pages(file_path: str) -> List[Dict]:
+    """Size and compression of each page, without decoding pixel data"""
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return _pages(_walk_ifds(buf))
+
+def read_tiff_page(file_path: str, page_number: int, grayscale: bool = False) -> np.ndarray:
+    with MappedTiff(file_path) as tiff:
+        return tiff.read_page(page_number, grayscale)
+
+def _jpeg_size(data) -> Optional[Tuple[int, int]]:
+    """(width, height) from the first start-of-frame marker"""
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # Markers without a length field
+            i += 2
+            continue
+        length = struct.unpack_from('>H', data, i + 2)[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack_from('>HH', data, i + 5)
+            return width, height
+        i += 2 + length
+    return None
+
+def pdf_page_count(file_path: str) -> int:
+    """Page count from the PDF's page tree, without rendering"""
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(file_path).get('Pages', 1))
+
+def sniff(data) -> Optional[Dict]:
+    """Format, MIME type, first-page dimensions and page count from the file's bytes
+
+    Returns None for anything that is not a PDF, JPEG, PNG or TIFF. A PDF's
+    page count needs the file on disk (pdf_page_count) and is reported as 1.
+    """
+    head = bytes(data[:8])
+    width = height = None
+    num_pages = 1
+    if head.startswith(b'%PDF-'):
+        kind = 'pdf'
+    elif head.startswith(b'\x89PNG\r\n\x1a\n'):
+        kind = 'png'
+        if len(data) < 24:
+            return None
+        width, height = struct.unpack_from('>II', data, 16)
+    elif head.startswith(b'\xff\xd8'):
+        kind = 'jpeg'
+        size = _jpeg_size(data)
+        if size is None:
+            return None
+        width, height = size
+    elif head[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+        kind = 'tiff'
+        try:
+            pages = _pages(_walk_ifds(data))
+        except Exception:
+            return None
+        if not pages:
+            return None
+        num_pages = len(pages)
+        width, height = pages[0]['width'], pages[0]['height']
+        # Largest page decides whether the file needs normalizing
+        largest = max(pages, key=lambda p: p['width'] * p['height'])
+        return {'format': kind, 'mime_type': FORMATS[kind][1], 'extension': FORMATS[kind][0],
+                'width': width, 'height': height, 'num_pages': num_pages,
+                'max_pixels': largest['width'] * largest['height']}
+    else:
+        return None
+
+    return {'format': kind, 'mime_type': FORMATS[kind][1], 'extension': FORMATS[kind][0],
+            'width': width, 'height': height, 'num_pages': num_pages,
+            'max_pixels': (width or 0) * (height or 0)}
+
+def _fit(width: int, height: int, max_pixels: int) -> Tuple[int, int]:
+    scale = (max_pixels / (width * height)) ** 0.5
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def _normalize_tiff(file_path: str, max_pixels: int):
+    """Rewrite a TIFF with every oversized page scaled down, one page at a time"""
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with MappedTiff(file_path) as tiff, TiffImagePlugin.AppendingTiffWriter(tmp_path, True) as out:
+            for page_number in range(1, len(tiff) + 1):
+                width, height = tiff.page_size(page_number)
+                frame = tiff.frame(page_number)
+                if width * height > max_pixels:
+                    bilevel = frame.mode == '1'
+                    frame = frame.convert('L' if bilevel or frame.mode in ('L', 'I;16', 'I', 'F') else 'RGB')
+                    frame = frame.resize(_fit(width, height, max_pixels), Image.Resampling.BOX)
+                    if bilevel:
+                        # Back to 1-bit so the page stays G4-compressed
+                        frame = frame.point(lambda v: 255 if v >= 128 else 0).convert('1')
+                frame.save(out, format='TIFF', compression='group4' if frame.mode == '1' else 'tiff_lzw')
+                out.newFrame()
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def normalize_image(file_path: str, info: Dict, max_pixels: int) -> Dict:
+    """Scale an oversized raster down to max_pixels once, in place; returns updated info"""
+    if info['format'] == 'pdf' or not max_pixels or info['max_pixels'] <= max_pixels:
+        return info
+
+    if info['format'] == 'tiff':
+        _normalize_tiff(file_path, max_pixels)
+        pages = tiff_pages(file_path)
+        largest = max(pages, key=lambda p: p['width'] * p['height'])
+        return {**info, 'width': pages[0]['width'], 'height': pages[0]['height'],
+                'max_pixels': largest['width'] * largest['height'],
+                'original_size': (info['width'], info['height'])}
+
+    width, height = info['width'], info['height']
+    # Let the decoder reduce by a power of two first (JPEG decodes directly at the smaller size)
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+    factor = max(f for f in flags if width * height / (f * f) >= max_pixels)
+    img = cv2.imread(file_path, flags[factor])
+    if img is None:
+        raise Exception(f"Failed to read image: {file_path}")
+    # Sized from the decoded image: the decoder has already applied any EXIF rotation
+    target = _fit(img.shape[1], img.shape[0], max_pixels)
+    img = cv2.resize(img, target, interpolation=cv2.INTER_AREA)
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, 95] if info['format'] == 'jpeg' else []
+    tmp_path = f"{file_path}.{os.getpid()}.tmp{info['extension']}"
+    try:
+        if not cv2.imwrite(tmp_path, img, params):
+            raise Exception(f"Failed to write normalized image: {file_path}")
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {**info, 'width': target[0], 'height': target[1], 'max_pixels': target[0] * target[1],
+            'original_size': (width, height)}
@@ -1,11 +1,36 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
 from database import engine, Base
 from models import *
 
+def upgrade_database():
+    """Add columns that were added to existing tables since the database was created"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # Created in full by create_all
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = str(CreateColumn(column).compile(dialect=engine.dialect))
+                for fk in column.foreign_keys:
+                    ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+                    if fk.ondelete:
+                        ddl += f" ON DELETE {fk.ondelete}"
+                print(f"Adding column {table.name}.{column.name}")
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
 def init_database():
     print("Creating all database tables...")
     Base.metadata.create_all(bind=engine)
     print("Database tables created successfully!")
     
+    # create_all never alters existing tables
+    upgrade_database()
+    
     # Create default roles
     from sqlalchemy.orm import Session
     from database import SessionLocal
@@ -4,30 +4,52 @@ Supports: OpenAI GPT-4o, GPT-4o-mini, Ollama local models
 """
 
 import os
+import re
 import json
 import time
-import requests
 import asyncio
 from typing import Dict, List, Optional
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from ollama_client import get_ollama_client
+
+# Most OCR text (characters) sent to each model; longer documents are cut down page by page
+LLM_CLOUD_MAX_CHARS = int(os.getenv('LLM_CLOUD_MAX_CHARS', '48000'))
+LLM_LOCAL_MAX_CHARS = int(os.getenv('LLM_LOCAL_MAX_CHARS', '12000'))
+# Ollama context window (tokens); its default is too small for multi-page prompts
+LLM_LOCAL_NUM_CTX = int(os.getenv('LLM_LOCAL_NUM_CTX', '8192'))
+
+def fit_ocr_text(text: str, max_chars: int) -> str:
+    """Trim combined OCR text to max_chars, giving every page a fair share instead of keeping only the first"""
+    if len(text) <= max_chars:
+        return text
+    # Pages are joined as "[Page N]" sections by OCREngine.combine_page_results
+    pages = re.split(r'\n\n(?=\[Page \d+\]\n)', text)
+    budget = max(0, max_chars - 2 * (len(pages) - 1))
+    # Short pages are kept whole; what they leave unused goes to the longer ones
+    remaining = sorted(range(len(pages)), key=lambda i: len(pages[i]))
+    limits = {}
+    while remaining:
+        share = budget // len(remaining)
+        i = remaining.pop(0)
+        limits[i] = min(len(pages[i]), share)
+        budget -= limits[i]
+    return '\n\n'.join(page[:limits[i]] for i, page in enumerate(pages))
 
 class LLMProcessor:
     def __init__(self):
         self.emergent_llm_key = os.getenv('OPENAI_API_KEY') or os.getenv('EMERGENT_LLM_KEY')
-        self.ollama_base_url = "http://localhost:11434"
+        # Shared keep-alive pool to Ollama (OLLAMA_BASE_URL)
+        self.ollama = get_ollama_client()
+        self.ollama_base_url = self.ollama.base_url
         self.use_local = False  # Default to cloud
         self.local_model = "qwen2.5:3b-instruct"
     
     def check_local_model_available(self) -> bool:
         """Check if local Ollama model is available and has enough memory"""
         try:
-            response = requests.get(f"{self.ollama_base_url}/api/tags", timeout=2)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                return len(models) > 0
-        except:
-            pass
-        return False
+            return len(self.ollama.list_models_sync()) > 0
+        except Exception:
+            return False
     
     async def process_with_cloud_llm_async(
         self, 
@@ -53,8 +75,8 @@ class LLMProcessor:
 Required fields:
 {field_descriptions}
 
-OCR Text:
-{ocr_text[:2000]}
+OCR Text (in reading order; table cells are separated by " | "):
+{fit_ocr_text(ocr_text, LLM_CLOUD_MAX_CHARS)}
 
 Return format:
 {{
@@ -147,45 +169,33 @@ If a field is not found, use null for value and 0.0 for confidence.
 
 {field_descriptions}
 
-Text:
-{ocr_text[:1500]}
+Text (in reading order; table cells are separated by " | "):
+{fit_ocr_text(ocr_text, LLM_LOCAL_MAX_CHARS)}
 
 Return only JSON with field names as keys and extracted values. Include confidence (0-1) for each field."""
         
         try:
-            response = requests.post(
-                f"{self.ollama_base_url}/api/generate",
-                json={
-                    "model": self.local_model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "format": "json"
-                },
-                timeout=120
-            )
+            # Waits on the shared pool; at most OLLAMA_CONCURRENCY generations run at once
+            result = self.ollama.generate_sync(self.local_model, prompt, format="json",
+                                               options={'num_ctx': LLM_LOCAL_NUM_CTX})
             
             processing_time = time.time() - start_time
+            extracted_data = json.loads(result.get('response', '{}'))
             
-            if response.status_code == 200:
-                result = response.json()
-                extracted_data = json.loads(result.get('response', '{}'))
-                
-                # Calculate overall confidence
-                confidence_scores = [
-                    v for k, v in extracted_data.items() 
-                    if k.endswith('_confidence') and isinstance(v, (int, float))
-                ]
-                overall_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.5
-                
-                return {
-                    'model': self.local_model,
-                    'extracted_fields': extracted_data,
-                    'overall_confidence': overall_confidence,
-                    'processing_time': processing_time,
-                    'tokens_used': 0
-                }
-            else:
-                raise Exception(f"Ollama error: {response.status_code}")
+            # Calculate overall confidence
+            confidence_scores = [
+                v for k, v in extracted_data.items() 
+                if k.endswith('_confidence') and isinstance(v, (int, float))
+            ]
+            overall_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.5
+            
+            return {
+                'model': self.local_model,
+                'extracted_fields': extracted_data,
+                'overall_confidence': overall_confidence,
+                'processing_time': processing_time,
+                'tokens_used': 0
+            }
                 
         except Exception as e:
             print(f"Local LLM error: {e}")
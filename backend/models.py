@@ -117,6 +117,7 @@ class FormSchema(Base):
     description = Column(Text)
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
+    ocr_confidence_threshold = Column(Float)  # Cascade OCR stops once a result clears this
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -140,6 +141,7 @@ class FormField(Base):
     cross_field_rules = Column(JSON)  # Validation rules with other fields
     field_group = Column(String(255))  # For grouping fields into sections
     display_order = Column(Integer, default=0)
+    region = Column(JSON)  # Normalized {x, y, width, height, page} zone for fixed-layout forms
     created_at = Column(DateTime, default=datetime.utcnow)
     
     schema = relationship("FormSchema", back_populates="fields")
@@ -181,6 +183,11 @@ class DocumentPage(Base):
     image_path = Column(String(1000))  # S3 path for page image
     preprocessed_path = Column(String(1000))  # Preprocessed image path
     quality_score = Column(Float, default=0.0)
+    width = Column(Integer)  # Page size in OCR box coordinates (pixels)
+    height = Column(Integer)
+    phash = Column(String(64))  # Perceptual hash of the upright page, for near-duplicate detection
+    content_hash = Column(String(64))  # SHA-256 of the upright page pixels, for exact-copy checks
+    duplicate_of_page_id = Column(Integer, ForeignKey("document_pages.id", ondelete="SET NULL"))  # Page whose OCR this one reused/matched
     created_at = Column(DateTime, default=datetime.utcnow)
     
     document = relationship("Document", back_populates="pages")
@@ -0,0 +1,149 @@
+"""
+Batched RapidOCR text recognition
+Detection still runs per page, but text-line crops from concurrently processed
+pages/documents are queued and recognized together so ONNX Runtime runs full
+batches instead of one page's lines at a time. A batch only waits for more
+crops while another page is in detection; a lone caller (e.g. a Celery prefork
+worker) is recognized straight away.
+"""
+
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import List, Tuple
+import cv2
+import numpy as np
+
+RAPIDOCR_BATCHING = os.getenv('RAPIDOCR_BATCHING', 'false').lower() == 'true'
+RAPIDOCR_MAX_BATCH_SIZE = int(os.getenv('RAPIDOCR_MAX_BATCH_SIZE', '32'))
+# Longest a batch waits for crops from other pages still in detection
+RAPIDOCR_MAX_WAIT_MS = float(os.getenv('RAPIDOCR_MAX_WAIT_MS', '20'))
+# Same default as RapidOCR's own text_score filter
+RAPIDOCR_TEXT_SCORE = float(os.getenv('RAPIDOCR_TEXT_SCORE', '0.5'))
+
+def sort_boxes(dt_boxes: np.ndarray) -> List[np.ndarray]:
+    """Sort detected quads top-to-bottom, then left-to-right within a line"""
+    boxes = sorted(dt_boxes, key=lambda b: (b[0][1], b[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+def crop_text_line(img: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Perspective-crop a detected quad into an upright text-line image"""
+    points = points.astype(np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(img, matrix, (width, height),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+
+    # Vertical text lines are rotated so the recognizer sees them horizontally
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+class RecognitionBatcher:
+    """Collects text-line crops from many callers and recognizes them in batches"""
+
+    def __init__(self, rapid_ocr, max_batch_size: int = RAPIDOCR_MAX_BATCH_SIZE,
+                 max_wait_ms: float = RAPIDOCR_MAX_WAIT_MS):
+        self.text_rec = rapid_ocr.text_rec
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Let ONNX Runtime consume a whole collected batch in one run
+        self.text_rec.rec_batch_num = max_batch_size
+
+        self._queue = queue.Queue()
+        # Pages between detection and recognition, i.e. callers that may still submit crops
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._stats = {'batches': 0, 'crops': 0}
+        self._thread = threading.Thread(target=self._run, name='rapidocr-batcher', daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def page(self):
+        """Mark a page as in progress, so batches wait for its crops"""
+        with self._active_lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._active_lock:
+                self._active -= 1
+
+    def submit(self, crops: List[np.ndarray]) -> Future:
+        """Queue crops; the future resolves to a list of (text, score)"""
+        future = Future()
+        if not crops:
+            future.set_result([])
+        else:
+            self._queue.put((crops, future))
+        return future
+
+    def recognize(self, crops: List[np.ndarray], timeout: float = None) -> List[Tuple[str, float]]:
+        """Recognize crops, sharing a batch with whatever else is queued"""
+        return self.submit(crops).result(timeout=timeout)
+
+    def _collect(self) -> List[Tuple[List[np.ndarray], Future]]:
+        """Block for one request, then gather more until the batch is full, max_wait passes or
+        no other page can still submit"""
+        requests = [self._queue.get()]
+        count = len(requests[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while count < self.max_batch_size:
+            try:
+                # Whatever is already queued joins the batch without waiting
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._active <= len(requests):
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            requests.append(request)
+            count += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            crops = [crop for request_crops, _ in requests for crop in request_crops]
+            try:
+                rec_res, _ = self.text_rec(crops)
+            except Exception as e:
+                print(f"Batched recognition error: {e}")
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            self._stats['batches'] += 1
+            self._stats['crops'] += len(crops)
+
+            offset = 0
+            for request_crops, future in requests:
+                chunk = rec_res[offset:offset + len(request_crops)]
+                offset += len(request_crops)
+                future.set_result([(item[0], float(item[1])) for item in chunk])
+
+    def stats(self) -> dict:
+        batches = self._stats['batches']
+        return {
+            **self._stats,
+            'avg_batch_size': round(self._stats['crops'] / batches, 2) if batches else 0.0,
+            'queued': self._queue.qsize(),
+            'active_pages': self._active
+        }
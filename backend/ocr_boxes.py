@@ -0,0 +1,159 @@
+"""
+Columnar OCR bounding boxes
+A page's boxes are held as one float32 quad array, one float32 confidence
+array and a list of strings instead of a dict per word. They are stored in
+OCRResult.bounding_boxes / the OCR cache as base64-packed arrays and turned
+into per-box JSON objects only when an API response needs them.
+"""
+
+import base64
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+import numpy as np
+
+COMPACT_FORMAT = 'boxes/v1'
+
+def _pack(array: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii')
+
+def _unpack(data: str, dtype, shape) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=dtype).reshape(shape).copy()
+
+class BoxArray:
+    """N text boxes: quads (N, 4, 2), confidences (N,) and texts"""
+
+    __slots__ = ('quads', 'confidences', 'texts')
+
+    def __init__(self, quads: np.ndarray, confidences: np.ndarray, texts: List[str]):
+        self.quads = np.asarray(quads, dtype=np.float32).reshape(-1, 4, 2)
+        self.confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+        self.texts = list(texts)
+        if not (len(self.quads) == len(self.confidences) == len(self.texts)):
+            raise ValueError("BoxArray columns must have the same length")
+
+    # Construction
+
+    @classmethod
+    def empty(cls) -> 'BoxArray':
+        return cls(np.zeros((0, 4, 2), np.float32), np.zeros(0, np.float32), [])
+
+    @classmethod
+    def from_rects(cls, rects: Union[np.ndarray, Sequence], texts: List[str],
+                   confidences: Union[np.ndarray, Sequence, float] = 1.0) -> 'BoxArray':
+        """From axis-aligned (x1, y1, x2, y2) rows"""
+        rects = np.asarray(rects, dtype=np.float32).reshape(-1, 4)
+        x1, y1, x2, y2 = rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3]
+        quads = np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                          np.stack([x2, y2], 1), np.stack([x1, y2], 1)], axis=1)
+        return cls(quads, np.broadcast_to(np.asarray(confidences, np.float32), (len(rects),)), texts)
+
+    @classmethod
+    def from_xywh(cls, xywh: Union[np.ndarray, Sequence], texts: List[str],
+                  confidences: Union[np.ndarray, Sequence, float] = 1.0) -> 'BoxArray':
+        """From (x, y, width, height) rows, as Tesseract reports words"""
+        xywh = np.asarray(xywh, dtype=np.float32).reshape(-1, 4)
+        rects = np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1)
+        return cls.from_rects(rects, texts, confidences)
+
+    @classmethod
+    def from_dicts(cls, boxes: Iterable[Dict]) -> 'BoxArray':
+        """From per-box dicts ({'points'|'x','y','width','height', 'text', 'confidence'})"""
+        quads, confidences, texts = [], [], []
+        for box in boxes:
+            if 'points' in box:
+                quads.append(np.asarray(box['points'], np.float32).reshape(4, 2))
+            else:
+                x, y, w, h = box['x'], box['y'], box['width'], box['height']
+                quads.append(np.float32([[x, y], [x + w, y], [x + w, y + h], [x, y + h]]))
+            confidences.append(box.get('confidence', 1.0))
+            texts.append(box.get('text', ''))
+        if not quads:
+            return cls.empty()
+        return cls(np.stack(quads), confidences, texts)
+
+    @classmethod
+    def from_compact(cls, data: Dict) -> 'BoxArray':
+        count = int(data['count'])
+        return cls(_unpack(data['quads'], np.float32, (count, 4, 2)),
+                   _unpack(data['confidences'], np.float32, (count,)), data['texts'])
+
+    @classmethod
+    def from_any(cls, value) -> 'BoxArray':
+        """Accept a BoxArray, its compact form, or a legacy list of dicts"""
+        if isinstance(value, BoxArray):
+            return value
+        if not value:
+            return cls.empty()
+        if isinstance(value, dict) and value.get('format') == COMPACT_FORMAT:
+            return cls.from_compact(value)
+        return cls.from_dicts(value)
+
+    @classmethod
+    def concat(cls, arrays: Iterable['BoxArray']) -> 'BoxArray':
+        arrays = [a for a in arrays if len(a)]
+        if not arrays:
+            return cls.empty()
+        return cls(np.concatenate([a.quads for a in arrays]),
+                   np.concatenate([a.confidences for a in arrays]),
+                   [text for a in arrays for text in a.texts])
+
+    # Access
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __bool__(self) -> bool:
+        return len(self.texts) > 0
+
+    def rects(self) -> np.ndarray:
+        """Axis-aligned (x1, y1, x2, y2) per box, shape (N, 4)"""
+        if not len(self):
+            return np.zeros((0, 4), np.float32)
+        return np.concatenate([self.quads.min(axis=1), self.quads.max(axis=1)], axis=1)
+
+    def take(self, indices: Union[np.ndarray, Sequence[int]]) -> 'BoxArray':
+        """Subset (or reorder) by integer indices or a boolean mask"""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return BoxArray(self.quads[indices], self.confidences[indices], [self.texts[i] for i in indices])
+
+    def offset(self, dx: float, dy: float) -> 'BoxArray':
+        """Shift from crop coordinates into page coordinates"""
+        return BoxArray(self.quads + np.float32([dx, dy]), self.confidences, self.texts)
+
+    def scale(self, factor: float) -> 'BoxArray':
+        return BoxArray(self.quads * np.float32(factor), self.confidences, self.texts)
+
+    def text(self, separator: str = ' ') -> str:
+        return separator.join(self.texts)
+
+    def mean_confidence(self) -> float:
+        return float(self.confidences.mean()) if len(self) else 0.0
+
+    # Serialization
+
+    def to_compact(self) -> Dict:
+        """JSON-safe storage form: packed arrays plus the text list"""
+        return {
+            'format': COMPACT_FORMAT,
+            'count': len(self),
+            'quads': _pack(self.quads),
+            'confidences': _pack(self.confidences),
+            'texts': self.texts
+        }
+
+    def to_dicts(self, indices: Optional[Iterable[int]] = None) -> List[Dict]:
+        """Per-box JSON objects, for API responses only"""
+        quads = np.round(self.quads, 1).tolist()
+        confidences = np.round(self.confidences, 4).tolist()
+        order = range(len(self)) if indices is None else indices
+        return [{'points': quads[i], 'text': self.texts[i], 'confidence': confidences[i]} for i in order]
+
+    def __getstate__(self):
+        return self.quads, self.confidences, self.texts
+
+    def __setstate__(self, state):
+        self.quads, self.confidences, self.texts = state
+
+    def __repr__(self) -> str:
+        return f"BoxArray({len(self)} boxes)"
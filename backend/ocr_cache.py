@@ -0,0 +1,202 @@
+"""
+Content-addressed OCR result cache
+Results are keyed by the SHA-256 of the page pixels plus the engine name and
+engine/config version. A small in-memory LRU sits in front of a persistent
+on-disk tier that is evicted by total size.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+from ocr_boxes import BoxArray
+
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'true').lower() == 'true'
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', '/app/cache/ocr')
+OCR_CACHE_MEMORY_ITEMS = int(os.getenv('OCR_CACHE_MEMORY_ITEMS', '256'))
+OCR_CACHE_MAX_DISK_MB = int(os.getenv('OCR_CACHE_MAX_DISK_MB', '512'))
+
+def hash_image(img: np.ndarray) -> str:
+    """SHA-256 of the decoded pixels (shape and dtype included)"""
+    digest = hashlib.sha256()
+    digest.update(f"{img.shape}|{img.dtype}".encode())
+    digest.update(np.ascontiguousarray(img).data)
+    return digest.hexdigest()
+
+def _json_default(value):
+    """Serialize numpy values and box arrays that engines leave in their results"""
+    if isinstance(value, BoxArray):
+        return value.to_compact()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class OCRCache:
+    def __init__(self, cache_dir: str = OCR_CACHE_DIR, max_memory_items: int = OCR_CACHE_MEMORY_ITEMS,
+                 max_disk_bytes: int = OCR_CACHE_MAX_DISK_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._disk_bytes = self._scan_disk_usage()
+
+    @staticmethod
+    def make_key(image_hash: str, engine: str, version: str) -> str:
+        """Cache key for one engine run on one page"""
+        return hashlib.sha256(f"{image_hash}:{engine}:{version}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _scan_disk_usage(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _remember(self, key: str, result: Dict):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Look a result up in memory, then on disk"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return dict(self._memory[key])
+
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                result = json.load(f)
+            # Refresh mtime so size eviction drops least recently used entries first
+            os.utime(path, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self._remember(key, result)
+            self._stats['disk_hits'] += 1
+        return dict(result)
+
+    def set(self, key: str, result: Dict):
+        """Store a result in both tiers"""
+        try:
+            payload = json.dumps(result, default=_json_default)
+        except (TypeError, ValueError) as e:
+            print(f"OCR cache serialization error: {e}")
+            return
+
+        with self._lock:
+            self._remember(key, json.loads(payload))
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"OCR cache write error: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(payload) - old_size
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier is at 90% of its budget"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self._stats['evictions'] += evicted
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._memory.clear()
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    os.remove(os.path.join(root, name))
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            hits = self._stats['memory_hits'] + self._stats['disk_hits']
+            lookups = hits + self._stats['misses']
+            return {
+                **self._stats,
+                'hits': hits,
+                'lookups': lookups,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_items': len(self._memory),
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """Process-wide cache instance (None when caching is disabled)"""
+    global _cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = OCRCache()
+            except OSError as e:
+                print(f"OCR cache unavailable: {e}")
+                return None
+        return _cache
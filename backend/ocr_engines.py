@@ -3,196 +3,1370 @@ from rapidocr_onnxruntime import RapidOCR
 from PIL import Image
 import cv2
 import numpy as np
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Tuple, List, Iterator, Union, Optional
 import time
 import os
-from pdf2image import convert_from_path
+import threading
+import multiprocessing
+import importlib.metadata
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from pdf2image import convert_from_path, pdfinfo_from_path
+from ocr_cache import get_ocr_cache, hash_image
+from ocr_batching import (RecognitionBatcher, RAPIDOCR_BATCHING, RAPIDOCR_TEXT_SCORE,
+                          sort_boxes, crop_text_line)
+from ocr_tiling import iter_tiles, merge_tile_boxes
+from ocr_boxes import BoxArray
+from ocr_paddle import PaddleBackend
+from ocr_orientation import OCR_ORIENTATION, correct_orientation, apply_orientation
+from page_dedup import PageHashIndex, page_hash, texts_match
+from image_io import is_tiff, tiff_pages, read_tiff_page
+from ocr_layout import OCR_LAYOUT, layout_text
+from ocr_spatial import SpatialIndex, fields_from_index
+from ocr_preprocessing import OCR_PREPROCESSING, load_or_preprocess
+from ocr_router import (EngineStats, get_engine_spec, engine_allowed, select_engines, probe_engine,
+                        resolve_policy, quality_band, list_engines)
+
+# Optional: embedded PDF text extraction for born-digital PDFs
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# Optional: in-process Tesseract bindings (pip install tesserocr, needs libtesseract)
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Tesseract backend: 'pytesseract' spawns a process per call, 'tesserocr' keeps the
+# Tesseract API (and its traineddata) loaded in-process and reuses it across pages
+TESSERACT_BACKEND = os.getenv('TESSERACT_BACKEND', 'pytesseract')
+TESSERACT_CMD = os.getenv('TESSERACT_CMD', '/usr/bin/tesseract')
+TESSERACT_LANG = os.getenv('TESSERACT_LANG', 'eng')
+# Page segmentation mode, the same for both backends (3: fully automatic, Tesseract's default)
+TESSERACT_PSM = int(os.getenv('TESSERACT_PSM', '3'))
+
+# Rasterization DPI for PDF pages
+PDF_RENDER_DPI = 300
+
+# Adaptive rasterization: probe each PDF page at low DPI, measure text height and
+# render at the lowest DPI that keeps text lines at OCR-friendly pixel heights
+OCR_ADAPTIVE_DPI = os.getenv('OCR_ADAPTIVE_DPI', 'false').lower() == 'true'
+ADAPTIVE_PROBE_DPI = 72
+ADAPTIVE_MIN_DPI = int(os.getenv('OCR_ADAPTIVE_MIN_DPI', '150'))
+ADAPTIVE_MAX_DPI = int(os.getenv('OCR_ADAPTIVE_MAX_DPI', '400'))
+ADAPTIVE_TARGET_TEXT_HEIGHT = float(os.getenv('OCR_ADAPTIVE_TEXT_HEIGHT', '20'))
+# Pages whose best OCR confidence is below this are re-rendered at a higher DPI
+ADAPTIVE_RETRY_CONFIDENCE = float(os.getenv('OCR_ADAPTIVE_RETRY_CONFIDENCE', '0.70'))
+
+# Minimum non-space characters for a page's text layer to count as complete
+PDF_TEXT_MIN_CHARS = int(os.getenv('OCR_PDF_TEXT_MIN_CHARS', '50'))
+# Pages whose images cover more than this share of the page are scans unless their
+# text layer also covers at least the minimum share (a stamp or Bates number does not)
+PDF_TEXT_MAX_IMAGE_COVERAGE = float(os.getenv('OCR_PDF_TEXT_MAX_IMAGE_COVERAGE', '0.5'))
+PDF_TEXT_MIN_TEXT_COVERAGE = float(os.getenv('OCR_PDF_TEXT_MIN_TEXT_COVERAGE', '0.05'))
+
+# Region-of-interest OCR for fixed-layout forms
+OCR_ROI_ENGINE = os.getenv('OCR_ROI_ENGINE', 'rapidocr')
+OCR_ROI_PADDING = float(os.getenv('OCR_ROI_PADDING', '0.01'))
+# Alignment check: share of regions that must return confident text, else full-page OCR
+OCR_ROI_MIN_CONFIDENCE = float(os.getenv('OCR_ROI_MIN_CONFIDENCE', '0.5'))
+OCR_ROI_MIN_HIT_RATIO = float(os.getenv('OCR_ROI_MIN_HIT_RATIO', '0.6'))
+
+# Tiled OCR for very large pages: pages above the threshold are OCR'd in overlapping
+# tiles from a single grayscale buffer that never exceeds the per-page pixel ceiling.
+# Tiled pages are orientation-corrected but not preprocessed or checked for duplicates
+OCR_TILE_THRESHOLD_PIXELS = int(os.getenv('OCR_TILE_THRESHOLD_PIXELS', str(30_000_000)))
+OCR_MAX_PAGE_PIXELS = int(os.getenv('OCR_MAX_PAGE_PIXELS', str(120_000_000)))
+OCR_TILE_SIZE = int(os.getenv('OCR_TILE_SIZE', '2048'))
+OCR_TILE_OVERLAP = int(os.getenv('OCR_TILE_OVERLAP', '160'))
+OCR_TILE_ENGINE = os.getenv('OCR_TILE_ENGINE', 'rapidocr')
+# Only JPEG decodes straight to a reduced size; other rasters (PNG, TIFF frames) are decoded at full
+# size before being scaled to the ceiling, so larger ones are refused rather than decoded
+OCR_MAX_DECODE_PIXELS = int(os.getenv('OCR_MAX_DECODE_PIXELS', str(2 * OCR_MAX_PAGE_PIXELS)))
+
+# Write rendered PDF pages to disk (<uuid>_pageN.jpg); pages are otherwise kept in memory only
+OCR_SAVE_PAGE_IMAGES = os.getenv('OCR_SAVE_PAGE_IMAGES', 'false').lower() == 'true'
+
+# Quality is estimated on a thumbnail whose long side is at most this many pixels
+QUALITY_THUMBNAIL_SIDE = int(os.getenv('OCR_QUALITY_THUMBNAIL_SIDE', '1024'))
+QUALITY_PDF_DPI = 72
+# Edge steepness (strongest edges relative to the ink/background step) from blurred to crisp
+QUALITY_SHARPNESS_LOW = float(os.getenv('OCR_QUALITY_SHARPNESS_LOW', '0.70'))
+QUALITY_SHARPNESS_HIGH = float(os.getenv('OCR_QUALITY_SHARPNESS_HIGH', '1.15'))
+# Ink/background separation (0-1) at and above which contrast no longer lowers the score
+QUALITY_CONTRAST_NORM = float(os.getenv('OCR_QUALITY_CONTRAST_NORM', '0.25'))
+# Ink step over background noise sigma at and above which noise no longer lowers the score
+QUALITY_SNR_NORM = float(os.getenv('OCR_QUALITY_SNR_NORM', '60'))
+
+# Page-parallel OCR: fan pages of multi-page documents out to a process pool (API processes only:
+# daemonic workers such as Celery's prefork pool cannot have children and process pages sequentially)
+OCR_PARALLEL_PAGES = os.getenv('OCR_PARALLEL_PAGES', 'false').lower() == 'true'
+OCR_PAGE_WORKERS = int(os.getenv('OCR_PAGE_WORKERS', '0')) or (os.cpu_count() or 1)
+
+# Bump when routing/engine configuration changes to invalidate cached OCR results
+OCR_CONFIG_VERSION = '2'
+
+# Run the engines selected for a page concurrently ('all' mode) with a per-engine timeout
+OCR_CONCURRENT_ENGINES = os.getenv('OCR_CONCURRENT_ENGINES', 'false').lower() == 'true'
+OCR_ENGINE_THREADS = int(os.getenv('OCR_ENGINE_THREADS', '4'))
+OCR_ENGINE_TIMEOUT = float(os.getenv('OCR_ENGINE_TIMEOUT', '120'))
+
+
+_page_pool = None
+_page_pool_lock = threading.Lock()
+_engine_executor = None
+_engine_executor_lock = threading.Lock()
+# Engine calls still running after their timeout, in retired engine pools
+_stuck_engine_calls = set()
+
+def page_text(boxes: BoxArray) -> str:
+    """Text of a page's boxes, in layout reading order unless OCR_LAYOUT is off"""
+    return layout_text(boxes) if OCR_LAYOUT else boxes.text()
+
+def box_coverage(rects: List[Tuple[float, float, float, float]], width: float, height: float,
+                 grid: int = 200) -> float:
+    """Share of a width x height area covered by the union of (x0, y0, x1, y1) rectangles"""
+    if not rects or width <= 0 or height <= 0:
+        return 0.0
+    covered = np.zeros((grid, grid), dtype=bool)
+    for x0, y0, x1, y1 in rects:
+        c0, c1 = sorted((int(x0 / width * grid), int(np.ceil(x1 / width * grid))))
+        r0, r1 = sorted((int(y0 / height * grid), int(np.ceil(y1 / height * grid))))
+        covered[max(r0, 0):min(r1, grid), max(c0, 0):min(c1, grid)] = True
+    return float(covered.mean())
+
+def _package_version(package: str) -> str:
+    try:
+        return importlib.metadata.version(package)
+    except Exception:
+        return 'unknown'
+
+def _tesseract_version(backend: str) -> str:
+    try:
+        if backend == 'tesserocr':
+            return tesserocr.tesseract_version().splitlines()[0]
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        return 'unknown'
 
 class OCREngine:
     def __init__(self):
         self.rapid_ocr = RapidOCR()
+        self.rapid_batcher = RecognitionBatcher(self.rapid_ocr) if RAPIDOCR_BATCHING else None
+        
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        self.tesseract_backend = TESSERACT_BACKEND
+        if self.tesseract_backend == 'tesserocr' and tesserocr is None:
+            print("tesserocr not installed, falling back to pytesseract")
+            self.tesseract_backend = 'pytesseract'
+        self._tesseract_local = threading.local()
+        
+        self.engine_versions = {
+            'tesseract': f"{self.tesseract_backend}/{_tesseract_version(self.tesseract_backend)}",
+            'rapidocr': _package_version('rapidocr_onnxruntime'),
+            'paddleocr': _package_version('paddleocr')
+        }
+        # Settings that change an engine's output, so cached results made under others are not reused
+        self.engine_settings = {
+            'tesseract': f"lang={TESSERACT_LANG},psm={TESSERACT_PSM}",
+            'rapidocr': f"text_score={RAPIDOCR_TEXT_SCORE}"
+        }
+        self.cache = get_ocr_cache()
+        self.engine_stats = EngineStats()
+        
+        # Imported and loaded only when routing first selects it, unloaded when idle
+        self.paddle = PaddleBackend()
     
-    def convert_pdf_to_image(self, pdf_path: str) -> str:
-        """Convert PDF first page to image"""
+    def get_page_count(self, file_path: str) -> int:
+        """Get number of pages without rendering (1 for plain images)"""
+        if is_tiff(file_path):
+            try:
+                return len(tiff_pages(file_path))
+            except Exception as e:
+                print(f"TIFF header error: {e}")
+                raise Exception(f"Failed to read TIFF page count: {str(e)}")
+        if not file_path.lower().endswith('.pdf'):
+            return 1
         try:
-            # Convert with higher DPI for better OCR quality
-            images = convert_from_path(pdf_path, first_page=1, last_page=1, dpi=300)
-            if images:
-                # Save as temporary image
-                image_path = pdf_path.replace('.pdf', '_page1.jpg')
-                images[0].save(image_path, 'JPEG', quality=95)
-                return image_path
-            else:
-                raise Exception("No images extracted from PDF")
+            info = pdfinfo_from_path(file_path)
+            return int(info.get('Pages', 1))
         except Exception as e:
-            print(f"PDF conversion error: {e}")
-            raise Exception(f"Failed to convert PDF to image: {str(e)}")
+            print(f"PDF info error: {e}")
+            raise Exception(f"Failed to read PDF page count: {str(e)}")
+    
+    def render_pdf_page(self, pdf_path: str, page_number: int, dpi: int = None) -> np.ndarray:
+        """Render a single PDF page to a BGR numpy array"""
+        images = convert_from_path(pdf_path, first_page=page_number, last_page=page_number,
+                                   dpi=dpi or PDF_RENDER_DPI)
+        if not images:
+            raise Exception(f"No image extracted from PDF page {page_number}")
+        return self.pil_to_array(images[0])
     
-    def preprocess_image(self, image_path: str) -> np.ndarray:
-        """Preprocess image for better OCR results"""
-        img = cv2.imread(image_path)
+    @staticmethod
+    def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+        """Median height in pixels of glyph-sized connected components (None if no text)"""
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        if count < 2:
+            return None
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        # Drop specks, rules, frames and large figures
+        glyphs = (heights >= 3) & (heights <= gray.shape[0] * 0.05) & (widths <= heights * 4)
+        if np.count_nonzero(glyphs) < 20:
+            return None
+        return float(np.median(heights[glyphs]))
+    
+    def choose_render_dpi(self, pdf_path: str, page_number: int) -> int:
+        """Lowest DPI that keeps this page's text above the engines' recognition height"""
+        try:
+            probe = convert_from_path(pdf_path, first_page=page_number, last_page=page_number,
+                                      dpi=ADAPTIVE_PROBE_DPI, grayscale=True)
+            if not probe:
+                return PDF_RENDER_DPI
+            text_height = self.estimate_text_height(np.asarray(probe[0]))
+            probe[0].close()
+        except Exception as e:
+            print(f"DPI probe error: {e}")
+            return PDF_RENDER_DPI
         
-        # Denoise
-        denoised = cv2.fastNlMeansDenoising(gray)
+        if not text_height:
+            # No measurable text (photo, blank page): keep the default
+            return PDF_RENDER_DPI
         
-        # Enhance contrast
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced = clahe.apply(denoised)
+        dpi = ADAPTIVE_PROBE_DPI * ADAPTIVE_TARGET_TEXT_HEIGHT / text_height
+        dpi = int(round(dpi / 10) * 10)
+        return max(ADAPTIVE_MIN_DPI, min(ADAPTIVE_MAX_DPI, dpi))
+    
+    @staticmethod
+    def pil_to_array(image: Image.Image) -> np.ndarray:
+        """Convert a PIL image to a BGR array and release the PIL buffer"""
+        try:
+            rgb = np.asarray(image.convert('RGB'))
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        finally:
+            image.close()
+    
+    def load_image(self, image: Union[str, np.ndarray]) -> np.ndarray:
+        """Decode an image once into a BGR array (arrays pass through)"""
+        if isinstance(image, np.ndarray):
+            return image
         
-        # Binarization
-        _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        if image.lower().endswith('.pdf'):
+            return self.render_pdf_page(image, 1)
+        if is_tiff(image):
+            return read_tiff_page(image, 1)
         
-        return binary
+        img = cv2.imread(image, cv2.IMREAD_COLOR)
+        if img is None:
+            raise Exception(f"Failed to read image: {image}")
+        return img
     
-    def assess_quality(self, image_path: str) -> float:
-        """Assess image quality (0-1 score)"""
-        try:
-            # Convert PDF to image if needed
-            if image_path.lower().endswith('.pdf'):
-                return 0.75  # Default quality for PDFs
-            
-            img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            
-            if img is None or img.size == 0:
-                return 0.5  # Default medium quality if can't read
-            
-            # Calculate variance of Laplacian (blur detection)
-            laplacian_var = cv2.Laplacian(img, cv2.CV_64F).var()
-            
-            # Normalize to 0-1 scale (higher is better)
-            quality_score = min(laplacian_var / 1000, 1.0)
-            
-            return quality_score
-        except Exception as e:
-            print(f"Quality assessment error: {e}")
-            return 0.5  # Default medium quality on error
+    def load_page(self, file_path: str, page_number: int, grayscale: bool = False) -> np.ndarray:
+        """Decode one page of an image file (one frame of a multi-page TIFF)"""
+        if is_tiff(file_path):
+            if grayscale:
+                self.check_decode_size(file_path, self.image_pixels(file_path, page_number))
+            img = read_tiff_page(file_path, page_number, grayscale)
+            height, width = img.shape[:2]
+            if grayscale and width * height > OCR_MAX_PAGE_PIXELS:
+                # Large-format frame: same per-page pixel ceiling as other large images
+                scale = (OCR_MAX_PAGE_PIXELS / (width * height)) ** 0.5
+                img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            return img
+        if grayscale:
+            return self.load_large_image(file_path)
+        return self.load_image(file_path)
     
-    def run_tesseract(self, image_path: str) -> Dict:
-        """Run Tesseract OCR"""
-        start_time = time.time()
+    @staticmethod
+    def is_multipage_format(file_path: str) -> bool:
+        """Pages of PDFs and TIFFs are extracted from the file rather than being the file itself"""
+        return file_path.lower().endswith('.pdf') or is_tiff(file_path)
+    
+    def result_image_path(self, img: np.ndarray, file_path: str, page_number: int,
+                          save_image: bool) -> Optional[str]:
+        """Page image to record: the upload itself, or a saved copy of a page extracted from it"""
+        if not self.is_multipage_format(file_path):
+            return file_path
+        return self.save_page_image(img, file_path, page_number) if save_image else None
+    
+    def page_image_path(self, pdf_path: str, page_number: int) -> str:
+        """Path of the rasterized image for a PDF or TIFF page"""
+        return f"{os.path.splitext(pdf_path)[0]}_page{page_number}.jpg"
+    
+    def save_page_image(self, image: np.ndarray, pdf_path: str, page_number: int) -> str:
+        """Write a rendered page to disk as a JPEG derivative"""
+        image_path = self.page_image_path(pdf_path, page_number)
+        cv2.imwrite(image_path, image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        return image_path
+    
+    def prepare_page(self, img: np.ndarray, file_path: str, page_number: int,
+                     render_dpi: Optional[int] = None, policy: Dict = None) -> Tuple[np.ndarray, Dict, Optional[str]]:
+        """Assess a page and preprocess it for its quality band, reusing a stored result"""
+        quality = self.assess_quality_details(img)
+        processed, path = load_or_preprocess(img, self.quality_band(quality['score'], policy),
+                                             file_path, page_number, render_dpi)
+        return processed, quality, path
+    
+    def quality_thumbnail(self, image: Union[str, np.ndarray]) -> Optional[np.ndarray]:
+        """Small grayscale copy of a page for quality estimation"""
+        if isinstance(image, np.ndarray):
+            height, width = image.shape[:2]
+            scale = min(1.0, QUALITY_THUMBNAIL_SIDE / max(height, width))
+            if scale < 1.0:
+                image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
         
-        # Set tesseract path
-        pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
+        if image.lower().endswith('.pdf'):
+            # Render just the first page at thumbnail resolution
+            pages = convert_from_path(image, first_page=1, last_page=1, dpi=QUALITY_PDF_DPI, grayscale=True)
+            return self.quality_thumbnail(np.asarray(pages[0])) if pages else None
+        if is_tiff(image):
+            return self.quality_thumbnail(read_tiff_page(image, 1, grayscale=True))
         
-        # Handle PDF conversion if needed
-        if image_path.lower().endswith('.pdf'):
-            image_path = self.convert_pdf_to_image(image_path)
+        # Let the JPEG/PNG decoder downscale while decoding instead of decoding full size
+        thumb = cv2.imread(image, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if thumb is not None and max(thumb.shape[:2]) < QUALITY_THUMBNAIL_SIDE // 2:
+            thumb = cv2.imread(image, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+        return None if thumb is None else self.quality_thumbnail(thumb)
+    
+    def assess_quality_details(self, image: Union[str, np.ndarray]) -> Dict:
+        """Sharpness, contrast and noise signals plus a combined 0-1 score"""
+        thumb = self.quality_thumbnail(image)
+        if thumb is None or thumb.size == 0:
+            return {'score': 0.5, 'sharpness': 0.0, 'contrast': 0.0, 'noise': 0.0}
         
-        img = Image.open(image_path)
+        gray = thumb.astype(np.float32)
         
-        # Get text with confidence
-        data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+        # Contrast: separation of the ink and background classes that Otsu splits the page into
+        # (percentile spreads sit near 0 on mostly white pages)
+        _, ink = cv2.threshold(thumb, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        ink = ink.astype(bool)
+        ink_pixels = np.count_nonzero(ink)
+        if ink_pixels == 0 or ink_pixels == ink.size:
+            return {'score': 0.5, 'sharpness': 0.0, 'contrast': 0.0, 'noise': 0.0}
+        contrast = float(gray[~ink].mean() - gray[ink].mean()) / 255
         
-        # Extract text and calculate average confidence
-        texts = []
-        confidences = []
-        bounding_boxes = []
+        # Sharpness: steepest edges relative to the ink step, so it does not depend on how much ink
+        # the page carries (a Sobel response of 4 per grey level is an unblurred step)
+        magnitude = cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+        edges = magnitude > max(contrast * 255 * 0.5, 8.0)
+        sharpness = 0.0
+        if np.count_nonzero(edges) > 50 and contrast > 0:
+            sharpness = float(np.percentile(magnitude[edges], 90)) / (4 * contrast * 255)
         
-        for i in range(len(data['text'])):
-            if int(data['conf'][i]) > 0:
-                texts.append(data['text'][i])
-                confidences.append(int(data['conf'][i]))
-                bounding_boxes.append({
-                    'x': data['left'][i],
-                    'y': data['top'][i],
-                    'width': data['width'][i],
-                    'height': data['height'][i],
-                    'text': data['text'][i]
-                })
-        
-        full_text = ' '.join(texts)
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+        # Noise: Immerkaer's fast sigma estimate away from edges, where text strokes would count as noise
+        kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+        residual = np.abs(cv2.filter2D(gray, -1, kernel))
+        flat = ~cv2.dilate(edges.astype(np.uint8), np.ones((5, 5), np.uint8)).astype(bool)
+        flat[[0, -1], :] = False
+        flat[:, [0, -1]] = False
+        flat_pixels = np.count_nonzero(flat)
+        noise = float(np.sqrt(np.pi / 2) * residual[flat].sum() / (6 * flat_pixels)) if flat_pixels else 0.0
+        
+        # Each signal scales the score from 0 up to 1 once it is good enough for OCR
+        score = np.clip((sharpness - QUALITY_SHARPNESS_LOW) / (QUALITY_SHARPNESS_HIGH - QUALITY_SHARPNESS_LOW), 0, 1)
+        score *= min(contrast / QUALITY_CONTRAST_NORM, 1.0)
+        if noise > 0:
+            score *= min(contrast * 255 / noise / QUALITY_SNR_NORM, 1.0)
+        score = float(score)
+        
+        return {
+            'score': round(score, 4),
+            'sharpness': round(sharpness, 2),
+            'contrast': round(contrast, 4),
+            'noise': round(noise, 3)
+        }
+    
+    @staticmethod
+    def quality_band(score: float, policy: Dict = None) -> str:
+        """'high', 'medium' or 'low' for a quality score under a routing policy"""
+        return quality_band(score, policy)
+    
+    def run_tesseract(self, image: Union[str, np.ndarray]) -> Dict:
+        """Run Tesseract OCR"""
+        start_time = time.time()
+        
+        img = self.load_image(image)
+        if img.ndim == 3:
+            # Tesseract binarizes a grayscale image internally anyway
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        
+        # Get words with confidence (0-100) and boxes
+        if self.tesseract_backend == 'tesserocr':
+            words = self._tesseract_words_inprocess(img)
+        else:
+            words = self._tesseract_words_subprocess(img)
+        
+        # One columnar box array per page instead of a dict per word
+        if words:
+            texts = [w[0] for w in words]
+            confidences = np.array([w[1] for w in words], dtype=np.float32) / 100  # Normalize to 0-1
+            bounding_boxes = BoxArray.from_xywh([w[2:] for w in words], texts, confidences)
+        else:
+            bounding_boxes = BoxArray.empty()
         
         processing_time = time.time() - start_time
         
         return {
             'engine': 'tesseract',
-            'text': full_text,
-            'confidence': avg_confidence / 100,  # Normalize to 0-1
+            'text': page_text(bounding_boxes),
+            'confidence': bounding_boxes.mean_confidence(),
             'bounding_boxes': bounding_boxes,
             'processing_time': processing_time
         }
     
-    def run_rapidocr(self, image_path: str) -> Dict:
+    def _tesseract_words_subprocess(self, gray: np.ndarray) -> List[Tuple]:
+        """Words via pytesseract (one tesseract process per call)"""
+        # Timeout kills a stuck tesseract subprocess
+        data = pytesseract.image_to_data(gray, lang=TESSERACT_LANG, config=f'--psm {TESSERACT_PSM}',
+                                         output_type=pytesseract.Output.DICT, timeout=OCR_ENGINE_TIMEOUT)
+        
+        words = []
+        for i in range(len(data['text'])):
+            if int(data['conf'][i]) > 0:
+                words.append((
+                    data['text'][i],
+                    int(data['conf'][i]),
+                    data['left'][i],
+                    data['top'][i],
+                    data['width'][i],
+                    data['height'][i]
+                ))
+        return words
+    
+    def _tesseract_api(self):
+        """Persistent tesserocr handle for the calling thread (traineddata loaded once)"""
+        api = getattr(self._tesseract_local, 'api', None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=TESSERACT_LANG, psm=TESSERACT_PSM)
+            self._tesseract_local.api = api
+        return api
+    
+    def _tesseract_words_inprocess(self, gray: np.ndarray) -> List[Tuple]:
+        """Words via the Tesseract C API, reusing this thread's handle"""
+        api = self._tesseract_api()
+        gray = np.ascontiguousarray(gray)
+        height, width = gray.shape[:2]
+        api.SetImageBytes(gray.tobytes(), width, height, 1, width)
+        api.Recognize()
+        
+        words = []
+        iterator = api.GetIterator()
+        if iterator is not None:
+            level = tesserocr.RIL.WORD
+            for word in tesserocr.iterate_level(iterator, level):
+                try:
+                    text = word.GetUTF8Text(level)
+                except RuntimeError:
+                    # Empty result (e.g. a blank page): tesserocr raises instead of returning ''
+                    continue
+                conf = int(word.Confidence(level))
+                box = word.BoundingBox(level)
+                if not text or conf <= 0 or box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                words.append((text, conf, x1, y1, x2 - x1, y2 - y1))
+        
+        api.Clear()
+        return words
+    
+    def run_rapidocr(self, image: Union[str, np.ndarray]) -> Dict:
         """Run RapidOCR"""
         start_time = time.time()
         
-        # Handle PDF conversion if needed
-        if image_path.lower().endswith('.pdf'):
-            image_path = self.convert_pdf_to_image(image_path)
-        
-        result, elapse = self.rapid_ocr(image_path)
+        img = self.load_image(image)
+        if self.rapid_batcher is not None:
+            result = self._rapidocr_batched(img)
+        else:
+            result, elapse = self.rapid_ocr(img)
         
         if result:
-            texts = [item[1] for item in result]
-            confidences = [item[2] for item in result]
-            bounding_boxes = [{
-                'points': item[0],
-                'text': item[1],
-                'confidence': item[2]
-            } for item in result]
-            
-            full_text = ' '.join(texts)
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+            bounding_boxes = BoxArray(np.array([item[0] for item in result], dtype=np.float32),
+                                      [item[2] for item in result], [item[1] for item in result])
         else:
-            full_text = ''
-            avg_confidence = 0
-            bounding_boxes = []
+            bounding_boxes = BoxArray.empty()
         
         processing_time = time.time() - start_time
         
         return {
             'engine': 'rapidocr',
-            'text': full_text,
-            'confidence': avg_confidence,
+            'text': page_text(bounding_boxes),
+            'confidence': bounding_boxes.mean_confidence(),
             'bounding_boxes': bounding_boxes,
             'processing_time': processing_time
         }
     
-    def run_paddleocr(self, image_path: str) -> Dict:
-        """Run PaddleOCR (mock for now to save resources)"""
-        # Mock implementation - in production, use actual PaddleOCR
+    def _rapidocr_batched(self, img: np.ndarray) -> List:
+        """RapidOCR with per-page detection and shared, batched recognition"""
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        
+        with self.rapid_batcher.page():
+            dt_boxes, _ = self.rapid_ocr.text_det(img)
+            if dt_boxes is None or len(dt_boxes) == 0:
+                return []
+            
+            boxes = sort_boxes(dt_boxes)
+            crops = [crop_text_line(img, box) for box in boxes]
+            if getattr(self.rapid_ocr, 'use_cls', True):
+                crops, _, _ = self.rapid_ocr.text_cls(crops)
+            
+            recognized = self.rapid_batcher.recognize(crops, timeout=OCR_ENGINE_TIMEOUT)
+        
+        return [
+            [box.tolist(), text, score]
+            for box, (text, score) in zip(boxes, recognized)
+            if text and score >= RAPIDOCR_TEXT_SCORE
+        ]
+    
+    def run_pdf_text(self, pdf_path: str, page_number: int) -> Optional[Dict]:
+        """Words from a PDF page's embedded text layer (None if it has too little text)"""
+        if pdfium is None:
+            return None
+        
+        start_time = time.time()
+        try:
+            pdf = pdfium.PdfDocument(pdf_path)
+        except Exception as e:
+            print(f"PDF text layer error: {e}")
+            return None
+        
+        try:
+            page = pdf[page_number - 1]
+            try:
+                page_width, page_height = page.get_size()
+                words = self._pdf_text_words(page)
+            finally:
+                page.close()
+        except Exception as e:
+            print(f"PDF text layer error: {e}")
+            return None
+        finally:
+            pdf.close()
+        if words is None:
+            return None
+        
+        scale = PDF_RENDER_DPI / 72
+        bounding_boxes = BoxArray.from_rects([box for _, box in words], [text for text, _ in words])
+        
+        return {
+            'engine': 'pdf_text',
+            'text': page_text(bounding_boxes),
+            'confidence': 1.0,
+            'bounding_boxes': bounding_boxes,
+            'processing_time': time.time() - start_time,
+            'page_size': (round(page_width * scale), round(page_height * scale))
+        }
+    
+    @staticmethod
+    def _pdf_text_words(page) -> Optional[List[Tuple[str, Tuple]]]:
+        """Words of an open pdfium page with boxes in rendered pixels (None to OCR the page instead)"""
+        # Char boxes are in unrotated page space; let OCR handle rotated pages
+        if page.get_rotation() != 0:
+            return None
+        
+        page_width, page_height = page.get_size()
+        scale = PDF_RENDER_DPI / 72
+        # Pages render from their crop box, while char and object boxes are in page space
+        crop_left, crop_bottom, _, crop_top = page.get_cropbox()
+        
+        textpage = page.get_textpage()
+        try:
+            num_chars = textpage.count_chars()
+            chars = textpage.get_text_range()
+            if len(chars) != num_chars:
+                chars = ''.join(textpage.get_text_range(i, 1) for i in range(num_chars))
+            
+            visible = [c for c in chars if not c.isspace()]
+            if len(visible) < PDF_TEXT_MIN_CHARS:
+                return None
+            # Fonts without a Unicode map extract as garbage; OCR those pages instead
+            unmapped = sum(1 for c in visible if c == '\ufffd' or '\ue000' <= c <= '\uf8ff')
+            if unmapped / len(visible) > 0.1:
+                return None
+            
+            # Group characters into words, converting PDF points to pixels at the render DPI
+            words = []
+            word_text, word_box = [], None
+            for i, char in enumerate(chars):
+                if char.isspace():
+                    if word_text:
+                        words.append((''.join(word_text), word_box))
+                    word_text, word_box = [], None
+                    continue
+                
+                left, bottom, right, top = textpage.get_charbox(i)
+                box = (round((left - crop_left) * scale, 1), round((crop_top - top) * scale, 1),
+                       round((right - crop_left) * scale, 1), round((crop_top - bottom) * scale, 1))
+                word_text.append(char)
+                if word_box is None:
+                    word_box = box
+                else:
+                    word_box = (min(word_box[0], box[0]), min(word_box[1], box[1]),
+                                max(word_box[2], box[2]), max(word_box[3], box[3]))
+            if word_text:
+                words.append((''.join(word_text), word_box))
+        finally:
+            textpage.close()
+        
+        # A scan carrying a small text layer (header, stamp, Bates number) has enough characters
+        # but leaves the page body in the image: OCR pages that are mostly image and little text
+        image_rects = [(left - crop_left, bottom - crop_bottom, right - crop_left, top - crop_bottom)
+                       for left, bottom, right, top in
+                       (obj.get_bounds() for obj in page.get_objects(filter=[pdfium.raw.FPDF_PAGEOBJ_IMAGE]))]
+        image_coverage = box_coverage(image_rects, page_width, page_height)
+        if image_coverage > PDF_TEXT_MAX_IMAGE_COVERAGE:
+            text_coverage = box_coverage([box for _, box in words], page_width * scale, page_height * scale)
+            if text_coverage < PDF_TEXT_MIN_TEXT_COVERAGE:
+                return None
+        return words
+    
+    def run_paddleocr(self, image: Union[str, np.ndarray]) -> Dict:
+        """Run PaddleOCR"""
+        start_time = time.time()
+        
+        img = self.load_image(image)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        
+        predictions = self.paddle.predict(img)
+        
+        bounding_boxes = BoxArray.concat(
+            BoxArray(np.asarray(p['rec_polys'], dtype=np.float32), p['rec_scores'], p['rec_texts'])
+            for p in predictions if len(p['rec_texts'])
+        )
+        
         return {
             'engine': 'paddleocr',
-            'text': '[PaddleOCR - Not initialized to save resources]',
+            'text': page_text(bounding_boxes),
+            'confidence': bounding_boxes.mean_confidence(),
+            'bounding_boxes': bounding_boxes,
+            'processing_time': time.time() - start_time
+        }
+    
+    def run_engine(self, engine: str, img: np.ndarray, image_hash: Optional[str] = None,
+                   band: Optional[str] = None) -> Dict:
+        """Run one engine on a page, serving repeat pages from the OCR cache"""
+        runner = get_engine_spec(engine).runner
+        if isinstance(runner, str):
+            runner = getattr(self, runner)
+        else:
+            runner = lambda image, fn=runner: fn(self, image)
+        
+        if self.cache is None or image_hash is None:
+            return self._timed_run(engine, runner, img, band)
+        
+        # Cached results carry their page text, so the text layout is part of the version
+        layout = 'layout' if OCR_LAYOUT else 'flat'
+        version = (f"{self.engine_versions.get(engine, 'unknown')}:{self.engine_settings.get(engine, '')}:"
+                   f"{OCR_CONFIG_VERSION}:{layout}")
+        key = self.cache.make_key(image_hash, engine, version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            cached['bounding_boxes'] = BoxArray.from_any(cached.get('bounding_boxes'))
+            cached['cached'] = True
+            return cached
+        
+        result = self._timed_run(engine, runner, img, band)
+        self.cache.set(key, result)
+        return result
+    
+    def run_engine_or_fail(self, engine: str, img: np.ndarray, image_hash: Optional[str] = None,
+                           band: Optional[str] = None) -> Dict:
+        """run_engine, with an error turned into a failed result so the other engines still count"""
+        try:
+            return self.run_engine(engine, img, image_hash, band)
+        except Exception as e:
+            print(f"OCR engine error ({engine}): {e}")
+            return self.failed_result(engine, str(e))
+    
+    def _timed_run(self, engine: str, runner, img: np.ndarray, band: Optional[str] = None) -> Dict:
+        start_time = time.time()
+        try:
+            result = runner(img)
+        except Exception:
+            # A failing engine must not keep the estimate that got it selected
+            self.engine_stats.record(engine, time.time() - start_time, 0.0, band)
+            raise
+        self.engine_stats.record(engine, result['processing_time'], result['confidence'], band)
+        return result
+    
+    def engine_admitted(self, engine: str) -> bool:
+        """Whether an engine can take a page now (PaddleOCR only within its memory budget)"""
+        if engine == 'paddleocr':
+            return self.paddle.admits()
+        return True
+    
+    def engine_cost(self, engine: str) -> float:
+        """Rolling mean seconds per page for an engine"""
+        return self.engine_stats.estimate(engine)['latency']
+    
+    def can_run(self, engine: str, policy: Dict = None) -> bool:
+        """Whether an image engine is installed, allowed by the policy and can take a page now"""
+        return (engine_allowed(engine, policy) and 'image' in get_engine_spec(engine).inputs
+                and self.engine_admitted(engine))
+    
+    def policy_engine(self, preferred: str, policy: Dict = None) -> str:
+        """A fixed-engine path's configured engine, or the fastest allowed one if the policy excludes it"""
+        if self.can_run(preferred, policy):
+            return preferred
+        candidates = [spec.name for spec in list_engines('image') if self.can_run(spec.name, policy)]
+        if not candidates:
+            raise Exception("No OCR engine available for routing policy")
+        return min(candidates, key=self.engine_cost)
+    
+    @staticmethod
+    def failed_result(engine: str, error: str, processing_time: float = 0.0) -> Dict:
+        """Empty result for an engine that errored or timed out"""
+        return {
+            'engine': engine,
+            'text': '',
             'confidence': 0.0,
-            'bounding_boxes': [],
-            'processing_time': 0.0
+            'bounding_boxes': BoxArray.empty(),
+            'processing_time': processing_time,
+            'error': error
         }
     
-    def process_with_routing(self, image_path: str) -> Dict:
-        """Process image with intelligent OCR routing"""
-        # Convert PDF to image if needed
-        if image_path.lower().endswith('.pdf'):
-            image_path = self.convert_pdf_to_image(image_path)
+    def run_engines_concurrently(self, engines: List[str], img: np.ndarray, image_hash: Optional[str] = None,
+                                 timeout: float = None, band: Optional[str] = None) -> List[Dict]:
+        """Run several engines on the same page in parallel threads
+
+        The timeout is one deadline for the page, counted from submission. Engines
+        normally start together, so each gets the full timeout; when the shared pool
+        is saturated, time an engine spends queued counts against it.
+        """
+        if timeout is None:
+            timeout = OCR_ENGINE_TIMEOUT
         
-        quality_score = self.assess_quality(image_path)
+        # Tesseract runs as a subprocess and ONNX Runtime releases the GIL, so threads overlap
+        executor = get_engine_executor()
+        futures = [(engine, executor.submit(self.run_engine, engine, img, image_hash, band)) for engine in engines]
+        deadline = time.time() + timeout
         
         results = []
+        stuck = []
+        for engine, future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.time())))
+            except FutureTimeoutError:
+                if not future.cancel():
+                    # Already running: a thread cannot be interrupted, so the call keeps its thread
+                    stuck.append(future)
+                print(f"OCR engine timeout: {engine} exceeded {timeout}s")
+                # The call has not returned, so nothing else records it
+                self.engine_stats.record(engine, timeout, 0.0, band)
+                results.append(self.failed_result(engine, f'timed out after {timeout}s', timeout))
+            except Exception as e:
+                print(f"OCR engine error ({engine}): {e}")
+                results.append(self.failed_result(engine, str(e)))
+        if stuck:
+            retire_engine_executor(executor, stuck)
+        return results
+    
+    def process_with_routing(self, image: Union[str, np.ndarray], mode: str = None,
+                             confidence_threshold: float = None, concurrent: bool = None,
+                             quality: Dict = None, policy: Dict = None,
+                             known_results: Dict[str, Dict] = None) -> Dict:
+        """Process image with intelligent OCR routing (quality, and results of engines already run on
+        this image, may be passed in)"""
+        policy = resolve_policy(policy)
+        if mode is None:
+            mode = policy['mode']
+        if confidence_threshold is None:
+            confidence_threshold = policy['cascade_confidence']
+        if concurrent is None:
+            concurrent = OCR_CONCURRENT_ENGINES
+        
+        # Decode once; every stage below shares this buffer
+        img = self.load_image(image)
+        image_hash = hash_image(img) if self.cache is not None else None
+        
+        if quality is None:
+            try:
+                quality = self.assess_quality_details(img)
+            except Exception as e:
+                print(f"Quality assessment error: {e}")
+                quality = {'score': 0.5}
+        quality_score = quality['score']
+        band = self.quality_band(quality_score, policy)
         
-        if quality_score > 0.85:
-            # High quality: use RapidOCR + Tesseract
-            results.append(self.run_rapidocr(image_path))
-            results.append(self.run_tesseract(image_path))
-        elif quality_score > 0.60:
-            # Medium quality: use Tesseract + RapidOCR
-            results.append(self.run_tesseract(image_path))
-            results.append(self.run_rapidocr(image_path))
+        # Best expected confidence-for-latency trade-off for this band, from live engine stats
+        engines = select_engines(band, self.engine_stats, policy, admit=self.engine_admitted)
+        # Now and then an engine the estimates keep out runs too, so its estimate stays current
+        probe = probe_engine(band, engines, self.engine_stats, policy, admit=self.engine_admitted)
+        
+        # Engines already run on this image are not run again
+        results = list((known_results or {}).values())
+        engines = [engine for engine in engines if engine not in (known_results or {})]
+        if probe in (known_results or {}):
+            probe = None
+        
+        if mode == 'cascade':
+            # Cheapest engine first; stop as soon as one clears the threshold
+            for engine in sorted(engines, key=self.engine_cost):
+                if any(r['confidence'] >= confidence_threshold for r in results):
+                    break
+                results.append(self.run_engine_or_fail(engine, img, image_hash, band))
+            if probe is not None:
+                # Measured whether or not the cascade stopped early
+                results.append(self.run_engine_or_fail(probe, img, image_hash, band))
         else:
-            # Low quality: use all engines
-            results.append(self.run_tesseract(image_path))
-            results.append(self.run_rapidocr(image_path))
-            results.append(self.run_paddleocr(image_path))
+            if probe is not None:
+                engines = engines + [probe]
+            if concurrent and len(engines) > 1:
+                results += self.run_engines_concurrently(engines, img, image_hash, band=band)
+            else:
+                results += [self.run_engine_or_fail(engine, img, image_hash, band) for engine in engines]
         
         # Select best result
         best_result = max(results, key=lambda x: x['confidence'])
         
         return {
             'quality_score': quality_score,
+            'quality': quality,
+            'quality_band': band,
+            'routing_mode': mode,
             'engines_used': [r['engine'] for r in results],
+            'cache_hits': sum(1 for r in results if r.get('cached')),
             'best_result': best_result,
             'all_results': results
-        }
\ No newline at end of file
+        }
+    
+    def process_regions(self, image: Union[str, np.ndarray], regions: Dict[str, Dict],
+                        engine: str = None, policy: Dict = None) -> Optional[Dict]:
+        """OCR only the normalized field regions of a page (None if the layout doesn't line up)"""
+        if engine is None:
+            engine = self.policy_engine(OCR_ROI_ENGINE, policy)
+        
+        start_time = time.time()
+        img = self.load_image(image)
+        height, width = img.shape[:2]
+        
+        # Crops are views into the page buffer; nothing is copied until an engine needs it
+        crops = {}
+        for field_name, region in regions.items():
+            x0 = max(0, int((region['x'] - OCR_ROI_PADDING) * width))
+            y0 = max(0, int((region['y'] - OCR_ROI_PADDING) * height))
+            x1 = min(width, int((region['x'] + region['width'] + OCR_ROI_PADDING) * width))
+            y1 = min(height, int((region['y'] + region['height'] + OCR_ROI_PADDING) * height))
+            if x1 - x0 < 4 or y1 - y0 < 4:
+                continue
+            crops[field_name] = (x0, y0, img[y0:y1, x0:x1])
+        
+        if not crops:
+            return None
+        
+        executor = get_engine_executor()
+        futures = {
+            field_name: executor.submit(self.run_engine, engine, crop)
+            for field_name, (_, _, crop) in crops.items()
+        }
+        
+        fields = {}
+        bounding_boxes = []
+        stuck = []
+        for field_name, future in futures.items():
+            x0, y0, _ = crops[field_name]
+            try:
+                result = future.result(timeout=OCR_ENGINE_TIMEOUT)
+            except FutureTimeoutError:
+                if not future.cancel():
+                    stuck.append(future)
+                print(f"ROI OCR timeout ({field_name}): exceeded {OCR_ENGINE_TIMEOUT}s")
+                result = self.failed_result(engine, f'timed out after {OCR_ENGINE_TIMEOUT}s', OCR_ENGINE_TIMEOUT)
+            except Exception as e:
+                print(f"ROI OCR error ({field_name}): {e}")
+                result = self.failed_result(engine, str(e))
+            fields[field_name] = {
+                'text': result['text'],
+                'confidence': result['confidence']
+            }
+            bounding_boxes.append(result['bounding_boxes'].offset(x0, y0))
+        
+        if stuck:
+            retire_engine_executor(executor, stuck)
+        
+        # A misaligned scan puts the crops on blank paper or the wrong labels
+        hits = sum(1 for f in fields.values() if f['text'].strip() and f['confidence'] >= OCR_ROI_MIN_CONFIDENCE)
+        if hits / len(regions) < OCR_ROI_MIN_HIT_RATIO:
+            return None
+        
+        confidences = [f['confidence'] for f in fields.values() if f['text'].strip()]
+        return {
+            'engine': f'roi:{engine}',
+            'text': '\n'.join(f"{name}: {f['text']}" for name, f in fields.items()),
+            'confidence': sum(confidences) / len(confidences) if confidences else 0,
+            'bounding_boxes': BoxArray.concat(bounding_boxes),
+            'processing_time': time.time() - start_time,
+            'fields': fields
+        }
+    
+    def load_large_image(self, image_path: str) -> np.ndarray:
+        """Decode a large image as grayscale, reduced by the decoder until it fits OCR_MAX_PAGE_PIXELS"""
+        pixels = self.image_pixels(image_path)
+        
+        factor = 1
+        with open(image_path, 'rb') as f:
+            is_jpeg = f.read(2) == b'\xff\xd8'
+        if is_jpeg:
+            flags = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                     4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+            factor = next((f for f in (1, 2, 4, 8) if pixels / (f * f) <= OCR_MAX_PAGE_PIXELS), 8)
+        else:
+            # Other decoders only reduce after decoding everything
+            self.check_decode_size(image_path, pixels)
+            flags = {1: cv2.IMREAD_GRAYSCALE}
+        img = cv2.imread(image_path, flags[factor])
+        if img is None:
+            raise Exception(f"Failed to read image: {image_path}")
+        
+        height, width = img.shape[:2]
+        if width * height > OCR_MAX_PAGE_PIXELS:
+            scale = (OCR_MAX_PAGE_PIXELS / (width * height)) ** 0.5
+            img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        return img
+    
+    @staticmethod
+    def check_decode_size(image_path: str, pixels: int):
+        """Refuse a full-size decode beyond OCR_MAX_DECODE_PIXELS"""
+        if pixels > OCR_MAX_DECODE_PIXELS:
+            raise Exception(f"Image too large to decode: {pixels} pixels exceeds OCR_MAX_DECODE_PIXELS "
+                            f"({OCR_MAX_DECODE_PIXELS}); scale it down at upload (UPLOAD_MAX_PIXELS)")
+    
+    def image_pixels(self, image_path: str, page_number: int = 1) -> int:
+        """Pixel count from the image header, without decoding"""
+        if is_tiff(image_path):
+            try:
+                page = tiff_pages(image_path)[page_number - 1]
+                return page['width'] * page['height']
+            except Exception:
+                return 0
+        try:
+            with Image.open(image_path) as header:
+                width, height = header.size
+            return width * height
+        except Image.DecompressionBombError:
+            # PIL refuses to even open it: far beyond any sane page size
+            return OCR_MAX_PAGE_PIXELS * 4
+        except Exception:
+            return 0
+    
+    def pdf_page_pixels(self, pdf_path: str, page_number: int, dpi: int) -> int:
+        """Pixel count of a PDF page rendered at dpi, from its page size"""
+        if pdfium is None:
+            return 0
+        try:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                width_pt, height_pt = pdf[page_number - 1].get_size()
+            finally:
+                pdf.close()
+        except Exception:
+            return 0
+        return int(width_pt / 72 * dpi) * int(height_pt / 72 * dpi)
+    
+    def process_tiled(self, img: np.ndarray, engine: str = None, policy: Dict = None) -> Dict:
+        """OCR a large page tile by tile and merge boxes across tile seams"""
+        if engine is None:
+            engine = self.policy_engine(OCR_TILE_ENGINE, policy)
+        
+        start_time = time.time()
+        height, width = img.shape[:2]
+        
+        quality = self.assess_quality_details(img)
+        
+        tile_boxes = []
+        for x0, y0, x1, y1 in iter_tiles(width, height, OCR_TILE_SIZE, OCR_TILE_OVERLAP):
+            # Tiles are views into the page buffer; only one tile's engine buffers exist at a time
+            result = self.run_engine(engine, img[y0:y1, x0:x1])
+            tile_boxes.append(((x0, y0, x1, y1), result['bounding_boxes'].offset(x0, y0)))
+        
+        merged = merge_tile_boxes(tile_boxes, width, height)
+        
+        best_result = {
+            'engine': f'tiled:{engine}',
+            'text': page_text(merged),
+            'confidence': merged.mean_confidence(),
+            'bounding_boxes': merged,
+            'processing_time': time.time() - start_time,
+            'tiles': len(tile_boxes)
+        }
+        return {
+            'quality_score': quality['score'],
+            'quality': quality,
+            'routing_mode': 'tiled',
+            'engines_used': [best_result['engine']],
+            'cache_hits': 0,
+            'best_result': best_result,
+            'all_results': [best_result]
+        }
+    
+    def process_page(self, file_path: str, page_number: int, save_image: bool = None,
+                     confidence_threshold: float = None, regions: Dict[str, Dict] = None,
+                     policy: Dict = None, page_index: PageHashIndex = None,
+                     load_duplicate: Callable[[int], Optional[Dict]] = None) -> Dict:
+        """Rasterize (if needed) and OCR a single page of a document
+
+        load_duplicate(page_id) returns the stored OCR of an indexed page (see
+        page_dedup.load_stored_page); without it near-duplicates are only flagged.
+        """
+        if save_image is None:
+            save_image = OCR_SAVE_PAGE_IMAGES
+        policy = resolve_policy(policy)
+        
+        if (file_path.lower().endswith('.pdf') and policy['pdf_text_layer']
+                and engine_allowed('pdf_text', policy)):
+            # Born-digital page: skip rasterization and OCR entirely
+            text_result = self.run_pdf_text(file_path, page_number)
+            if text_result is not None:
+                return {
+                    'quality_score': 1.0,
+                    'quality': None,
+                    'routing_mode': 'pdf_text',
+                    'engines_used': ['pdf_text'],
+                    'cache_hits': 0,
+                    'best_result': text_result,
+                    'all_results': [text_result],
+                    'page_number': page_number,
+                    'image_path': None,
+                    'preprocessed_path': None,
+                    'render_dpi': PDF_RENDER_DPI,
+                    'page_size': text_result['page_size']
+                }
+        
+        render_dpi = None
+        if file_path.lower().endswith('.pdf'):
+            render_dpi = self.choose_render_dpi(file_path, page_number) if OCR_ADAPTIVE_DPI else PDF_RENDER_DPI
+            page_pixels = self.pdf_page_pixels(file_path, page_number, render_dpi)
+            if page_pixels > OCR_TILE_THRESHOLD_PIXELS:
+                # Large-format page: render grayscale, capped at the per-page pixel ceiling
+                if page_pixels > OCR_MAX_PAGE_PIXELS:
+                    render_dpi = int(render_dpi * (OCR_MAX_PAGE_PIXELS / page_pixels) ** 0.5)
+                images = convert_from_path(file_path, first_page=page_number, last_page=page_number,
+                                           dpi=render_dpi, grayscale=True)
+                if not images:
+                    raise Exception(f"No image extracted from PDF page {page_number}")
+                gray = np.asarray(images[0])
+                images[0].close()
+                return self._tiled_page_result(gray, file_path, page_number, render_dpi, save_image, policy, regions)
+            img = self.render_pdf_page(file_path, page_number, render_dpi)
+        else:
+            if self.image_pixels(file_path, page_number) > OCR_TILE_THRESHOLD_PIXELS:
+                gray = self.load_page(file_path, page_number, grayscale=True)
+                return self._tiled_page_result(gray, file_path, page_number, None, save_image, policy, regions)
+            img = self.load_page(file_path, page_number)
+        
+        # Sideways/upside-down/skewed scans are turned upright once, before any engine sees them
+        orientation = None
+        if OCR_ORIENTATION:
+            img, orientation = correct_orientation(img, dpi=render_dpi)
+        
+        # Near-duplicate of a page this tenant already processed (full-page OCR only: ROI
+        # results depend on the schema's regions)
+        phash, content_hash, duplicate, stored = None, None, None, None
+        if page_index is not None and not regions and policy['dedup'] != 'off':
+            phash = page_hash(img)
+            content_hash = hash_image(img)
+            duplicate = page_index.nearest(phash, int(policy['dedup_max_distance']))
+            if duplicate is not None and policy['dedup'] == 'reuse' and load_duplicate is not None:
+                stored = load_duplicate(duplicate[0])
+                if stored is None:
+                    # The matched page has been deleted since the index saw it
+                    duplicate = None
+                elif stored['content_hash'] == content_hash:
+                    # Identical pixels: an exact copy
+                    return self._duplicate_page_result(stored, duplicate, 'exact', img, file_path, page_number,
+                                                       save_image, render_dpi, None, orientation, phash,
+                                                       content_hash)
+        
+        # Engines see the preprocessed page; the original is what gets saved as the page image
+        ocr_img, quality, preprocessed_path = img, None, None
+        if OCR_PREPROCESSING:
+            ocr_img, quality, preprocessed_path = self.prepare_page(img, file_path, page_number, render_dpi, policy)
+        
+        known_results = {}
+        check_engine = stored['best_result']['engine'] if stored is not None else None
+        if check_engine is not None and self.can_run(check_engine, policy):
+            # A hash match alone is not enough: filled-in copies of one form look the same. Read
+            # the page with the engine that produced the stored OCR and compare the texts
+            if quality is None:
+                quality = self.assess_quality_details(ocr_img)
+            image_hash = hash_image(ocr_img) if self.cache is not None else None
+            check_result = self.run_engine_or_fail(check_engine, ocr_img, image_hash,
+                                                   self.quality_band(quality['score'], policy))
+            if texts_match(check_result['text'], stored['best_result']['text']):
+                return self._duplicate_page_result(stored, duplicate, 'text', img, file_path, page_number,
+                                                   save_image, render_dpi, preprocessed_path, orientation,
+                                                   phash, content_hash)
+            # Same layout, different content (e.g. another filled-in copy of the form): the read
+            # counts towards this page's own OCR
+            known_results[check_engine] = check_result
+        
+        if regions:
+            roi_result = self.process_regions(ocr_img, regions, policy=policy)
+            if roi_result is not None:
+                image_path = self.result_image_path(img, file_path, page_number, save_image)
+                return {
+                    'quality_score': None,
+                    'quality': None,
+                    'routing_mode': 'roi',
+                    'engines_used': [roi_result['engine']],
+                    'cache_hits': 0,
+                    'best_result': roi_result,
+                    'all_results': [roi_result],
+                    'page_number': page_number,
+                    'image_path': image_path,
+                    'preprocessed_path': preprocessed_path,
+                    'render_dpi': render_dpi,
+                    'page_size': (img.shape[1], img.shape[0]),
+                    'orientation': orientation
+                }
+            print(f"ROI alignment failed on page {page_number}, using full-page OCR")
+        
+        page_result = self.process_with_routing(ocr_img, confidence_threshold=confidence_threshold, quality=quality,
+                                                policy=policy, known_results=known_results)
+        if regions:
+            page_result['roi_fallback'] = True
+        
+        # Low confidence at a reduced DPI: render once more at higher resolution
+        if (render_dpi is not None and OCR_ADAPTIVE_DPI
+                and page_result['best_result']['confidence'] < ADAPTIVE_RETRY_CONFIDENCE
+                and render_dpi < ADAPTIVE_MAX_DPI):
+            retry_dpi = min(ADAPTIVE_MAX_DPI, max(PDF_RENDER_DPI, int(render_dpi * 1.5)))
+            retry_img = self.render_pdf_page(file_path, page_number, retry_dpi)
+            if orientation is not None:
+                retry_img = apply_orientation(retry_img, orientation)
+            retry_ocr_img, retry_quality, retry_path = retry_img, None, None
+            if OCR_PREPROCESSING:
+                retry_ocr_img, retry_quality, retry_path = self.prepare_page(retry_img, file_path, page_number,
+                                                                             retry_dpi, policy)
+            retry_result = self.process_with_routing(retry_ocr_img, confidence_threshold=confidence_threshold,
+                                                     quality=retry_quality, policy=policy)
+            if retry_result['best_result']['confidence'] > page_result['best_result']['confidence']:
+                page_result, img, render_dpi, preprocessed_path = retry_result, retry_img, retry_dpi, retry_path
+            del retry_img, retry_ocr_img
+        
+        if regions:
+            # Full-page fallback: read the field regions back out of the page's boxes
+            best_result = page_result['best_result']
+            index = SpatialIndex(best_result.get('bounding_boxes'))
+            best_result['fields'] = fields_from_index(index, regions, img.shape[1], img.shape[0], OCR_ROI_PADDING)
+        
+        image_path = self.result_image_path(img, file_path, page_number, save_image)
+        
+        page_result['page_number'] = page_number
+        page_result['image_path'] = image_path
+        page_result['preprocessed_path'] = preprocessed_path
+        page_result['render_dpi'] = render_dpi
+        page_result['page_size'] = (img.shape[1], img.shape[0])
+        page_result['orientation'] = orientation
+        page_result['phash'] = phash
+        page_result['content_hash'] = content_hash
+        if duplicate is not None:
+            page_result['duplicate_of'], page_result['duplicate_distance'] = duplicate
+        return page_result
+    
+    def _tiled_page_result(self, gray: np.ndarray, file_path: str, page_number: int,
+                           render_dpi: Optional[int], save_image: bool, policy: Dict = None,
+                           regions: Dict[str, Dict] = None) -> Dict:
+        """OCR a large-format page in tiles
+
+        Only orientation correction runs first. Near-duplicate checks and
+        preprocessing are skipped, since both need further page-sized buffers,
+        and field regions are read back from the tiles' boxes instead of being
+        cropped and OCR'd again.
+        """
+        orientation = None
+        if OCR_ORIENTATION:
+            # Detection works on a small copy; the rotation itself briefly holds two page buffers
+            gray, orientation = correct_orientation(gray, dpi=render_dpi)
+        page_result = self.process_tiled(gray, policy=policy)
+        if regions:
+            best_result = page_result['best_result']
+            index = SpatialIndex(best_result.get('bounding_boxes'))
+            best_result['fields'] = fields_from_index(index, regions, gray.shape[1], gray.shape[0], OCR_ROI_PADDING)
+        image_path = self.result_image_path(gray, file_path, page_number, save_image)
+        page_result['page_number'] = page_number
+        page_result['image_path'] = image_path
+        page_result['preprocessed_path'] = None
+        page_result['render_dpi'] = render_dpi
+        page_result['page_size'] = (gray.shape[1], gray.shape[0])
+        page_result['orientation'] = orientation
+        return page_result
+    
+    def _duplicate_page_result(self, stored: Dict, duplicate: Tuple[int, int], check: str, img: np.ndarray,
+                               file_path: str, page_number: int, save_image: bool, render_dpi: Optional[int],
+                               preprocessed_path: Optional[str], orientation: Optional[Dict],
+                               phash: str, content_hash: str) -> Dict:
+        """Page result that takes the stored OCR of the page it duplicates"""
+        return {
+            'quality_score': stored['quality_score'],
+            'quality': None,
+            'routing_mode': 'duplicate',
+            'engines_used': stored['engines_used'],
+            'cache_hits': 0,
+            'best_result': stored['best_result'],
+            'all_results': stored['all_results'],
+            'page_number': page_number,
+            'image_path': self.result_image_path(img, file_path, page_number, save_image),
+            'preprocessed_path': preprocessed_path,
+            'render_dpi': render_dpi,
+            'page_size': stored.get('page_size') or (img.shape[1], img.shape[0]),
+            'orientation': orientation,
+            'phash': phash,
+            'content_hash': content_hash,
+            'duplicate_of': duplicate[0],
+            'duplicate_distance': duplicate[1],
+            'duplicate_check': check
+        }
+    
+    def iter_process_document(self, file_path: str, parallel: bool = None,
+                              confidence_threshold: float = None,
+                              regions_by_page: Dict[int, Dict[str, Dict]] = None,
+                              policy: Dict = None, page_index: PageHashIndex = None,
+                              load_duplicate: Callable[[int], Optional[Dict]] = None) -> Iterator[Dict]:
+        """OCR a document page by page, yielding each page result in page order
+
+        Near-duplicate reuse decides per page whether to OCR at all, against pages
+        stored earlier (in this document too), so with dedup 'reuse' pages are always
+        processed one at a time; parallel only applies with dedup 'flag' or 'off'.
+        """
+        if parallel is None:
+            parallel = OCR_PARALLEL_PAGES
+        policy = resolve_policy(policy)
+        if page_index is not None and policy['dedup'] == 'reuse':
+            parallel = False
+        if parallel and multiprocessing.current_process().daemon:
+            # Daemonic processes (Celery's default prefork workers) may not start child processes
+            print("Page-parallel OCR unavailable in a daemonic worker, processing pages sequentially")
+            parallel = False
+        
+        num_pages = self.get_page_count(file_path)
+        regions_by_page = regions_by_page or {}
+        
+        if parallel and num_pages > 1:
+            # Each worker renders and OCRs its own page, so only page numbers cross processes.
+            # Workers get an empty index, which only makes them hash their page: matching
+            # against the tenant's index happens here, in page order, so each page also sees
+            # the pages of this document stored before it
+            pool = get_page_pool()
+            worker_index = PageHashIndex() if page_index is not None else None
+            futures = [
+                pool.submit(_process_page_in_worker, file_path, page_number, confidence_threshold,
+                            regions_by_page.get(page_number), policy, worker_index)
+                for page_number in range(1, num_pages + 1)
+            ]
+            for future in futures:
+                page_result = future.result()
+                self.record_worker_runs(page_result)
+                if page_index is not None and page_result.get('phash'):
+                    duplicate = page_index.nearest(page_result['phash'], int(policy['dedup_max_distance']))
+                    if duplicate is not None:
+                        page_result['duplicate_of'], page_result['duplicate_distance'] = duplicate
+                yield page_result
+            return
+        
+        for page_number in range(1, num_pages + 1):
+            yield self.process_page(file_path, page_number, confidence_threshold=confidence_threshold,
+                                    regions=regions_by_page.get(page_number), policy=policy,
+                                    page_index=page_index, load_duplicate=load_duplicate)
+    
+    def record_worker_runs(self, page_result: Dict):
+        """Feed engine runs made in a page worker into this process's cost model"""
+        if page_result['routing_mode'] not in ('all', 'cascade'):
+            return
+        for result in page_result['all_results']:
+            if not result.get('cached'):
+                self.engine_stats.record(result['engine'], result['processing_time'], result['confidence'],
+                                         page_result.get('quality_band'))
+    
+    @staticmethod
+    def combine_page_results(pages: List[Dict]) -> Dict:
+        """Merge per-page OCR results into document-level text and confidence"""
+        pages = sorted(pages, key=lambda p: p['page_number'])
+        
+        if len(pages) == 1:
+            text = pages[0]['best_result']['text']
+        else:
+            text = '\n\n'.join(
+                f"[Page {p['page_number']}]\n{p['best_result']['text']}"
+                for p in pages
+            )
+        
+        confidences = [p['best_result']['confidence'] for p in pages]
+        confidence = sum(confidences) / len(confidences) if confidences else 0
+        
+        return {
+            'num_pages': len(pages),
+            'pages': pages,
+            'text': text,
+            'confidence': confidence
+        }
+
+
+# Engine owned by each page worker process, loaded once when the worker starts
+_worker_engine = None
+
+def _init_page_worker():
+    """Warm up an OCREngine in a freshly started worker process"""
+    global _worker_engine
+    from engine_registry import get_ocr_engine
+    _worker_engine = get_ocr_engine()
+
+def _process_page_in_worker(file_path: str, page_number: int, confidence_threshold: float = None,
+                            regions: Dict[str, Dict] = None, policy: Dict = None,
+                            page_index: PageHashIndex = None) -> Dict:
+    """Process one page inside a pool worker"""
+    return _worker_engine.process_page(file_path, page_number, confidence_threshold=confidence_threshold,
+                                       regions=regions, policy=policy, page_index=page_index)
+
+def get_page_pool() -> ProcessPoolExecutor:
+    """Get the shared page worker pool, starting it on first use"""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            # spawn avoids forking ONNX Runtime / server threads into the workers
+            _page_pool = ProcessPoolExecutor(
+                max_workers=OCR_PAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_page_worker
+            )
+        return _page_pool
+
+def get_engine_executor() -> ThreadPoolExecutor:
+    """Get the shared thread pool used to run engines concurrently"""
+    global _engine_executor
+    with _engine_executor_lock:
+        if _engine_executor is None:
+            _engine_executor = ThreadPoolExecutor(max_workers=OCR_ENGINE_THREADS, thread_name_prefix='ocr-engine')
+        return _engine_executor
+
+def retire_engine_executor(executor: ThreadPoolExecutor, stuck: List[Future]):
+    """Give later pages a fresh engine pool while timed-out calls keep their threads in the old one"""
+    global _engine_executor
+    with _engine_executor_lock:
+        for future in stuck:
+            _stuck_engine_calls.add(future)
+            future.add_done_callback(_stuck_engine_calls.discard)
+        if _engine_executor is not executor:
+            # Another page already replaced it
+            return
+        _engine_executor = None
+    # Work already queued still runs; the old threads exit once idle (a hung call's thread when it returns)
+    executor.shutdown(wait=False)
+    print(f"OCR engine pool replaced; {len(_stuck_engine_calls)} timed-out engine call(s) still running")
+
+def stuck_engine_calls() -> int:
+    """Timed-out engine calls that have not returned yet"""
+    return len(_stuck_engine_calls)
+
+def shutdown_page_pool():
+    """Stop the page worker pool if it was started"""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is not None:
+            _page_pool.shutdown(wait=True)
+            _page_pool = None
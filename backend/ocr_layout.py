@@ -0,0 +1,166 @@
+"""
+Layout reconstruction from OCR boxes
+Boxes are grouped into lines by their vertical centres, lines are split into
+segments at wide horizontal gaps, runs of lines whose segments line up become
+tables, and the remaining segments are chained into text blocks. Blocks and
+tables are then put in reading order with a recursive XY-cut. All of this works
+on the (N, 4) rectangle array of a BoxArray with numpy, and the result is
+emitted as compact text: one line per text line, blank lines between blocks,
+table cells separated by " | ".
+"""
+
+import os
+from typing import Dict, List
+import numpy as np
+from ocr_boxes import BoxArray
+
+# Emit layout-ordered text instead of the engine's box order joined by spaces
+OCR_LAYOUT = os.getenv('OCR_LAYOUT', 'true').lower() == 'true'
+
+# All distances are in units of the median box height
+# Vertical centre distance still counted as the same line
+LINE_TOLERANCE = 0.5
+# Horizontal gap that splits a line into separate segments (columns, cells, label/value)
+SEGMENT_GAP = 1.5
+# Vertical gap between consecutive lines of one block
+BLOCK_GAP = 1.0
+# Aligned multi-segment rows needed to call something a table
+TABLE_MIN_ROWS = 2
+# Columns all wider than this share of the text width are prose columns, not a table
+PROSE_COLUMN_WIDTH = 0.3
+# Pairwise adjacency is computed in chunks of this many segments to bound memory
+_CHUNK = 1024
+
+def _line_ids(rects: np.ndarray, unit: float) -> np.ndarray:
+    """Line number of every box, lines numbered top to bottom"""
+    centres = (rects[:, 1] + rects[:, 3]) / 2
+    order = np.argsort(centres, kind='stable')
+    line_of = np.empty(len(rects), np.int64)
+    line_of[order] = np.concatenate([[0], np.cumsum(np.diff(centres[order]) > LINE_TOLERANCE * unit)])
+    return line_of
+
+def _segments(rects: np.ndarray, line_of: np.ndarray, unit: float) -> tuple:
+    """Boxes in (line, x) order, each segment's first position in that order, segment rects and lines"""
+    order = np.lexsort((rects[:, 0], line_of))
+    ordered, lines = rects[order], line_of[order]
+    gaps = ordered[1:, 0] - ordered[:-1, 2]
+    breaks = (lines[1:] != lines[:-1]) | (gaps > SEGMENT_GAP * unit)
+    starts = np.flatnonzero(np.concatenate([[True], breaks]))
+    seg_rects = np.stack([
+        np.minimum.reduceat(ordered[:, 0], starts),
+        np.minimum.reduceat(ordered[:, 1], starts),
+        np.maximum.reduceat(ordered[:, 2], starts),
+        np.maximum.reduceat(ordered[:, 3], starts)
+    ], axis=1)
+    return order, starts, seg_rects, lines[starts]
+
+def _tables(seg_rects: np.ndarray, seg_line: np.ndarray, text_width: float) -> List[List[int]]:
+    """Runs of consecutive lines with the same number of horizontally aligned segments"""
+    first = np.searchsorted(seg_line, np.arange(seg_line[-1] + 2))
+    counts = np.diff(first)
+
+    def aligned(a: int, b: int) -> bool:
+        cells_a = seg_rects[first[a]:first[a + 1]]
+        cells_b = seg_rects[first[b]:first[b + 1]]
+        # Each cell overlaps the cell in the same column of the other row
+        return bool(np.all(np.minimum(cells_a[:, 2], cells_b[:, 2]) > np.maximum(cells_a[:, 0], cells_b[:, 0])))
+
+    tables, run = [], []
+
+    def close(run):
+        if len(run) < TABLE_MIN_ROWS:
+            return
+        cells = np.stack([seg_rects[first[line]:first[line + 1]] for line in run])
+        widths = (cells[:, :, 2] - cells[:, :, 0]).mean(axis=0)
+        # Side-by-side text columns also line up; they read column by column instead
+        if np.all(widths > PROSE_COLUMN_WIDTH * text_width):
+            return
+        tables.append(run)
+
+    for line in range(len(counts)):
+        if counts[line] >= 2 and run and counts[line] == counts[run[-1]] and aligned(run[-1], line):
+            run.append(line)
+            continue
+        close(run)
+        run = [line] if counts[line] >= 2 else []
+    close(run)
+    return tables
+
+def _chain_blocks(seg_rects: np.ndarray, seg_line: np.ndarray, ids: np.ndarray, unit: float) -> List[np.ndarray]:
+    """Group segments into blocks: each links to the one segment directly below it, if unambiguous"""
+    rects, lines = seg_rects[ids], seg_line[ids]
+    sources, targets = [], []
+    for start in range(0, len(ids), _CHUNK):
+        upper = rects[start:start + _CHUNK]
+        overlap = np.minimum(upper[:, None, 2], rects[None, :, 2]) > np.maximum(upper[:, None, 0], rects[None, :, 0])
+        gap = rects[None, :, 1] - upper[:, None, 3]
+        below = lines[None, :] > lines[start:start + _CHUNK, None]
+        i, j = np.nonzero(overlap & below & (gap < BLOCK_GAP * unit))
+        sources.append(i + start)
+        targets.append(j)
+    sources = np.concatenate(sources) if sources else np.zeros(0, np.int64)
+    targets = np.concatenate(targets) if targets else np.zeros(0, np.int64)
+
+    # A segment above two (or below two) is where the layout forks: the blocks stop there
+    unique = (np.bincount(sources, minlength=len(ids))[sources] == 1) & \
+             (np.bincount(targets, minlength=len(ids))[targets] == 1)
+    below_of = np.full(len(ids), -1)
+    below_of[sources[unique]] = targets[unique]
+    has_above = np.zeros(len(ids), bool)
+    has_above[targets[unique]] = True
+
+    blocks = []
+    for head in np.flatnonzero(~has_above):
+        chain = [head]
+        while below_of[chain[-1]] >= 0:
+            chain.append(below_of[chain[-1]])
+        blocks.append(ids[chain])
+    return blocks
+
+def _xy_order(rects: np.ndarray, ids: np.ndarray) -> List[int]:
+    """Reading order by recursive XY-cut: split into rows at horizontal gaps, else into columns"""
+    if len(ids) <= 1:
+        return list(ids)
+    for axis in (1, 0):
+        order = ids[np.argsort(rects[ids, axis], kind='stable')]
+        reach = np.maximum.accumulate(rects[order, axis + 2])
+        cuts = np.flatnonzero(reach[:-1] <= rects[order[1:], axis]) + 1
+        if len(cuts):
+            return [i for group in np.split(order, cuts) for i in _xy_order(rects, group)]
+    return list(ids[np.lexsort((rects[ids, 0], rects[ids, 1]))])
+
+def analyze_layout(boxes: BoxArray) -> List[Dict]:
+    """Blocks and tables in reading order, each as rows of segment texts plus its rect"""
+    boxes = BoxArray.from_any(boxes)
+    keep = np.flatnonzero([bool(text.strip()) for text in boxes.texts])
+    if not len(keep):
+        return []
+    boxes = boxes.take(keep)
+    rects = boxes.rects()
+    unit = max(float(np.median(rects[:, 3] - rects[:, 1])), 1.0)
+    text_width = max(float(rects[:, 2].max() - rects[:, 0].min()), 1.0)
+
+    order, starts, seg_rects, seg_line = _segments(rects, _line_ids(rects, unit), unit)
+    ends = np.append(starts[1:], len(order))
+    seg_texts = [' '.join(boxes.texts[i] for i in order[a:b]) for a, b in zip(starts, ends)]
+
+    items = []
+    in_table = np.zeros(len(seg_rects), bool)
+    for run in _tables(seg_rects, seg_line, text_width):
+        rows = [np.flatnonzero(seg_line == line) for line in run]
+        members = np.concatenate(rows)
+        in_table[members] = True
+        items.append({'type': 'table', 'segments': members,
+                      'rows': [[seg_texts[s] for s in row] for row in rows]})
+    for block in _chain_blocks(seg_rects, seg_line, np.flatnonzero(~in_table), unit):
+        items.append({'type': 'block', 'segments': block, 'rows': [[seg_texts[s]] for s in block]})
+
+    item_rects = np.array([[seg_rects[item['segments'], 0].min(), seg_rects[item['segments'], 1].min(),
+                            seg_rects[item['segments'], 2].max(), seg_rects[item['segments'], 3].max()]
+                           for item in items])
+    return [{'type': items[i]['type'], 'rect': item_rects[i].round(1).tolist(), 'rows': items[i]['rows']}
+            for i in _xy_order(item_rects, np.arange(len(items)))]
+
+def layout_text(boxes: BoxArray) -> str:
+    """Compact reading-order text: lines, blank lines between blocks, ' | ' between table cells"""
+    return '\n\n'.join('\n'.join(' | '.join(row) for row in item['rows']) for item in analyze_layout(boxes))
@@ -0,0 +1,175 @@
+"""
+Page orientation and skew estimation
+Works on a small binarized copy of the page: projection profiles tell upright
+text from text turned by 90 degrees, the ascender/descender balance of text
+lines tells upright from upside-down, and a small angle search over the row
+profile measures skew. Tesseract OSD, when selected, gets a grayscale copy at
+up to 300 DPI instead. The full-size page is then rotated once, in memory.
+"""
+
+import os
+from typing import Dict, Optional
+import cv2
+import numpy as np
+
+# Correct page rotation (0/90/180/270) and skew before OCR
+OCR_ORIENTATION = os.getenv('OCR_ORIENTATION', 'true').lower() == 'true'
+# 'profile' (projection profiles) or 'osd' (Tesseract orientation and script detection)
+OCR_ORIENTATION_METHOD = os.getenv('OCR_ORIENTATION_METHOD', 'profile')
+# Long side of the working copy used for all measurements
+ORIENTATION_SIDE = 600
+# Skew search range and the smallest angle worth rotating for
+MAX_SKEW = float(os.getenv('OCR_MAX_SKEW', '10'))
+MIN_SKEW = 0.3
+# How much sharper one axis' line structure must be before we call the page sideways
+SIDEWAYS_RATIO = 1.5
+# Ink above the x-height band vs below it needed to call the page upright/upside-down
+FLIP_RATIO = 1.15
+# Tesseract OSD needs real resolution: pages are only scaled down to this DPI, or, when the
+# DPI is unknown, to this long side (Letter/A4 at 300 DPI)
+OSD_DPI = 300
+OSD_MAX_SIDE = int(os.getenv('OCR_OSD_MAX_SIDE', '3300'))
+
+def _working_copy(img: np.ndarray, denoise: bool = False) -> np.ndarray:
+    """Small inverted binary image: text pixels are 1"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    scale = min(1.0, ORIENTATION_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(gray.shape[1] * scale), int(gray.shape[0] * scale)),
+                          interpolation=cv2.INTER_AREA)
+    if denoise:
+        # Smooth out speckle so scanner noise does not blur the line structure
+        gray = cv2.medianBlur(gray, 3)
+    _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return ink
+
+def _line_sharpness(ink: np.ndarray) -> float:
+    """How sharply the row profile steps between text lines and gaps"""
+    profile = ink.sum(axis=1).astype(np.float32)
+    # Light smoothing so glyph-level jitter does not count as line structure
+    profile = np.convolve(profile, np.ones(3, np.float32) / 3, mode='same')
+    mean = profile.mean()
+    # Normalized by the mean so page size and amount of text do not matter
+    return float(np.diff(profile).var() / (mean * mean)) if mean > 0 else 0.0
+
+def _rotate(img: np.ndarray, angle: float, border=cv2.BORDER_REPLICATE, value=0,
+            interpolation=cv2.INTER_LINEAR) -> np.ndarray:
+    height, width = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (width, height), flags=interpolation,
+                          borderMode=border, borderValue=value)
+
+def estimate_skew(ink: np.ndarray, max_skew: float = MAX_SKEW) -> tuple:
+    """Angle (degrees, counter-clockwise) that makes text lines horizontal, and its line sharpness"""
+    scores = {}
+
+    def score(angle):
+        if angle not in scores:
+            # Nearest-neighbour: interpolating a binary image leaves moire bands in the profile
+            scores[angle] = _line_sharpness(_rotate(ink, angle, cv2.BORDER_CONSTANT, 0, cv2.INTER_NEAREST))
+        return scores[angle]
+
+    # Coarse 1-degree search, then refine around the best angle
+    best = max((round(a, 1) for a in np.arange(-max_skew, max_skew + 0.5, 1.0)), key=score)
+    best = max((round(a, 1) for a in np.arange(best - 0.8, best + 0.85, 0.2)), key=score)
+    return float(best), scores[best]
+
+def _ascender_balance(ink: np.ndarray) -> float:
+    """Ink above the x-height band over ink below it, summed over text lines (>1: upright)"""
+    profile = ink.sum(axis=1).astype(np.float32)
+    if profile.max() == 0:
+        return 1.0
+    rows = profile > profile.max() * 0.05
+
+    above = below = 0.0
+    start = None
+    for y, is_text in enumerate(np.append(rows, False)):
+        if is_text and start is None:
+            start = y
+        elif not is_text and start is not None:
+            line = profile[start:y]
+            start = None
+            if len(line) < 4:
+                continue
+            # x-height band: rows carrying at least half the line's peak ink
+            core = np.flatnonzero(line >= line.max() * 0.5)
+            above += line[:core[0]].sum()
+            below += line[core[-1] + 1:].sum()
+    return (above + 1.0) / (below + 1.0)
+
+def _osd_copy(img: np.ndarray, dpi: Optional[int] = None) -> tuple:
+    """Grayscale page scaled down only as far as OSD allows, and its DPI if known"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    scale = min(1.0, OSD_DPI / dpi if dpi else OSD_MAX_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(gray.shape[1] * scale), int(gray.shape[0] * scale)),
+                          interpolation=cv2.INTER_AREA)
+    return gray, int(dpi * scale) if dpi else None
+
+def _detect_with_osd(img: np.ndarray, dpi: Optional[int] = None) -> Optional[int]:
+    """Clockwise rotation Tesseract OSD says the page needs, if it can tell"""
+    try:
+        import pytesseract
+        gray, dpi = _osd_copy(img, dpi)
+        osd = pytesseract.image_to_osd(gray, config=f'--dpi {dpi}' if dpi else '',
+                                       output_type=pytesseract.Output.DICT)
+        return int(osd.get('rotate', 0)) % 360
+    except Exception as e:
+        print(f"Orientation detection (OSD) error: {e}")
+        return None
+
+def detect_orientation(img: np.ndarray, method: str = None, dpi: Optional[int] = None) -> Dict:
+    """Rotation (clockwise degrees, multiple of 90) and residual skew needed to make the page upright"""
+    if method is None:
+        method = OCR_ORIENTATION_METHOD
+    ink = _working_copy(img)
+    if ink.sum() < 100:
+        # Blank page: nothing to measure
+        return {'rotation': 0, 'skew': 0.0, 'method': method}
+
+    rotation = None
+    if method == 'osd':
+        # The full-resolution page, not the binarized working copy: OSD fails below ~300 DPI
+        rotation = _detect_with_osd(img, dpi)
+
+    if rotation is not None:
+        skew, _ = estimate_skew(_apply_rotation(ink, rotation))
+    else:
+        if method == 'osd':
+            print("Orientation detection (OSD) inconclusive, using projection profiles")
+        method = 'profile'
+        # Text lines show up as sharp row-profile peaks along one axis once de-skewed
+        clean = _working_copy(img, denoise=True)
+        skew, sharpness = estimate_skew(clean)
+        sideways_skew, sideways_sharpness = estimate_skew(_apply_rotation(clean, 90))
+        rotation = 0
+        if sideways_sharpness > SIDEWAYS_RATIO * sharpness:
+            rotation, skew = 90, sideways_skew
+
+        # Thin ascenders and descenders survive only in the un-smoothed copy
+        upright = _apply_rotation(ink, rotation)
+        if abs(skew) >= MIN_SKEW:
+            upright = _rotate(upright, skew, cv2.BORDER_CONSTANT, 0)
+        if _ascender_balance(upright) < 1.0 / FLIP_RATIO:
+            # Rotations about the centre commute, so the measured skew still applies
+            rotation = (rotation + 180) % 360
+
+    return {'rotation': rotation, 'skew': skew if abs(skew) >= MIN_SKEW else 0.0, 'method': method}
+
+def _apply_rotation(img: np.ndarray, rotation: int) -> np.ndarray:
+    """Rotate clockwise by a multiple of 90 degrees (lossless)"""
+    codes = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+    return cv2.rotate(img, codes[rotation]) if rotation in codes else img
+
+def apply_orientation(img: np.ndarray, orientation: Dict) -> np.ndarray:
+    """Rotate a full-size page by a detected orientation"""
+    img = _apply_rotation(img, orientation.get('rotation', 0))
+    skew = orientation.get('skew', 0.0)
+    if abs(skew) >= MIN_SKEW:
+        img = _rotate(img, skew)
+    return img
+
+def correct_orientation(img: np.ndarray, method: str = None, dpi: Optional[int] = None) -> tuple:
+    """Return (upright page, orientation info)"""
+    orientation = detect_orientation(img, method, dpi)
+    return apply_orientation(img, orientation), orientation
@@ -0,0 +1,128 @@
+"""
+Lazily loaded, memory-budgeted PaddleOCR backend
+paddleocr is imported and its models loaded only when routing first sends a
+page to it, only if the process stays within its memory budget, and the
+models are dropped again after an idle period.
+"""
+
+import gc
+import os
+import time
+import ctypes
+import threading
+from typing import Dict, List
+import numpy as np
+
+# Optional: process memory accounting for the budget
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PADDLEOCR_LANG = os.getenv('PADDLEOCR_LANG', 'en')
+# Resident memory this process may reach with PaddleOCR loaded (0: no limit)
+PADDLEOCR_MEMORY_BUDGET_MB = int(os.getenv('PADDLEOCR_MEMORY_BUDGET_MB', '4096'))
+# Footprint assumed before the first load has been measured
+PADDLEOCR_EXPECTED_MB = int(os.getenv('PADDLEOCR_EXPECTED_MB', '1500'))
+# Unload the models after this many seconds without a request (0: never)
+PADDLEOCR_IDLE_UNLOAD_SECONDS = float(os.getenv('PADDLEOCR_IDLE_UNLOAD_SECONDS', '300'))
+
+def _rss_mb() -> float:
+    if psutil is None:
+        return 0.0
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+def _release_freed_memory():
+    """Hand freed heap pages back to the OS so RSS actually drops after unloading"""
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except Exception:
+        pass
+
+class PaddleBackend:
+    def __init__(self, lang: str = PADDLEOCR_LANG, memory_budget_mb: int = PADDLEOCR_MEMORY_BUDGET_MB,
+                 idle_unload_seconds: float = PADDLEOCR_IDLE_UNLOAD_SECONDS):
+        self.lang = lang
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_unload_seconds = idle_unload_seconds
+        self.footprint_mb = float(PADDLEOCR_EXPECTED_MB)
+
+        self._ocr = None
+        self._lock = threading.Lock()
+        self._last_used = 0.0
+        self._watcher = None
+        self._stats = {'loads': 0, 'unloads': 0, 'rejected': 0, 'requests': 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._ocr is not None
+
+    def admits(self) -> bool:
+        """Whether a page can be sent here now: loaded, or loading fits the memory budget"""
+        if self._ocr is not None or not self.memory_budget_mb or psutil is None:
+            return True
+        if _rss_mb() + self.footprint_mb <= self.memory_budget_mb:
+            return True
+        self._stats['rejected'] += 1
+        return False
+
+    def _load(self):
+        """Import paddleocr and build the pipeline (caller holds the lock)"""
+        rss_before = _rss_mb()
+        start_time = time.time()
+        from paddleocr import PaddleOCR
+        self._ocr = PaddleOCR(
+            use_doc_orientation_classify=False,
+            use_doc_unwarping=False,
+            use_textline_orientation=False,
+            lang=self.lang
+        )
+        if psutil is not None:
+            # Measured cost of this engine, used for later admission decisions
+            self.footprint_mb = max(_rss_mb() - rss_before, 1.0)
+        self._stats['loads'] += 1
+        print(f"PaddleOCR loaded in {time.time() - start_time:.1f}s (~{self.footprint_mb:.0f} MB)")
+
+        if self.idle_unload_seconds and (self._watcher is None or not self._watcher.is_alive()):
+            self._watcher = threading.Thread(target=self._watch_idle, name='paddleocr-idle', daemon=True)
+            self._watcher.start()
+
+    def predict(self, img: np.ndarray) -> List:
+        """Run the pipeline on a BGR image, loading it first if needed"""
+        # Paddle predictors are not safe to call from several threads at once
+        with self._lock:
+            if self._ocr is None:
+                self._load()
+            self._last_used = time.time()
+            self._stats['requests'] += 1
+            return list(self._ocr.predict(img))
+
+    def unload(self, idle_for: float = None) -> bool:
+        """Drop the models and give their memory back (only if unused for idle_for seconds)"""
+        with self._lock:
+            if self._ocr is None:
+                return False
+            if idle_for is not None and time.time() - self._last_used < idle_for:
+                return False
+            self._ocr = None
+            self._stats['unloads'] += 1
+        gc.collect()
+        _release_freed_memory()
+        print("PaddleOCR unloaded")
+        return True
+
+    def _watch_idle(self):
+        while True:
+            time.sleep(max(self.idle_unload_seconds / 4, 1.0))
+            if self._ocr is None or self.unload(idle_for=self.idle_unload_seconds):
+                return
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            'loaded': self.loaded,
+            'footprint_mb': round(self.footprint_mb, 1),
+            'rss_mb': round(_rss_mb(), 1) if psutil is not None else None,
+            'memory_budget_mb': self.memory_budget_mb,
+            'idle_seconds': round(time.time() - self._last_used, 1) if self.loaded else None
+        }
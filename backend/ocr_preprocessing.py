@@ -0,0 +1,178 @@
+"""
+Declarative image preprocessing for OCR
+A pipeline is a list of steps (grayscale, deskew, denoise, clahe, binarize),
+each optionally with parameters, chosen per quality band. Outputs are written
+next to the page so retries and engine re-runs load them instead of recomputing.
+"""
+
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Union
+import cv2
+import numpy as np
+
+# Preprocess pages before OCR using the pipeline for their quality band
+OCR_PREPROCESSING = os.getenv('OCR_PREPROCESSING', 'false').lower() == 'true'
+# Write preprocessed pages to disk (<page>_<band>_<signature>.png) for reuse
+OCR_PREPROCESS_SAVE = os.getenv('OCR_PREPROCESS_SAVE', 'true').lower() == 'true'
+
+# Steps are either a name or {"step": name, **params}. fastNlMeans is available as
+# denoise method "nlmeans" but is seconds per 300-DPI page, so no default uses it.
+DEFAULT_PIPELINES = {
+    'high': [],
+    'medium': [
+        'grayscale',
+        {'step': 'denoise', 'method': 'median', 'ksize': 3},
+        'clahe'
+    ],
+    'low': [
+        'grayscale',
+        'deskew',
+        {'step': 'denoise', 'method': 'bilateral', 'scale': 0.5},
+        'clahe',
+        {'step': 'binarize', 'method': 'otsu'}
+    ]
+}
+
+# JSON object mapping band -> step list, overriding the defaults band by band
+PREPROCESS_PIPELINES = {**DEFAULT_PIPELINES, **json.loads(os.getenv('OCR_PREPROCESS_PIPELINES', '{}'))}
+
+# Deskew measures the angle on a copy whose long side is at most this many pixels
+DESKEW_SIDE = 1024
+DESKEW_MAX_ANGLE = 15.0
+DESKEW_MIN_ANGLE = 0.3
+
+def _grayscale(img: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+def _downscaled(img: np.ndarray, scale: float) -> np.ndarray:
+    height, width = img.shape[:2]
+    return cv2.resize(img, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                      interpolation=cv2.INTER_AREA)
+
+def grayscale(img: np.ndarray) -> np.ndarray:
+    """Convert to single-channel grayscale"""
+    return _grayscale(img)
+
+def deskew(img: np.ndarray, max_angle: float = DESKEW_MAX_ANGLE) -> np.ndarray:
+    """Rotate the page so its text lines are horizontal"""
+    gray = _grayscale(img)
+    scale = min(1.0, DESKEW_SIDE / max(gray.shape[:2]))
+    small = _downscaled(gray, scale) if scale < 1.0 else gray
+
+    _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(ink)
+    if coords is None or len(coords) < 50:
+        return img
+
+    angle = cv2.minAreaRect(coords)[-1]
+    # minAreaRect reports angles in [0, 90); map to the smallest rotation
+    if angle > 45:
+        angle -= 90
+    if abs(angle) < DESKEW_MIN_ANGLE or abs(angle) > max_angle:
+        return img
+
+    height, width = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+def denoise(img: np.ndarray, method: str = 'median', scale: float = 1.0, ksize: int = 3,
+            diameter: int = 5, sigma: float = 50.0, strength: float = 10.0) -> np.ndarray:
+    """Remove speckle noise; scale < 1 filters a downscaled copy and upsamples the result"""
+    height, width = img.shape[:2]
+    work = _downscaled(img, scale) if scale < 1.0 else img
+
+    if method == 'median':
+        out = cv2.medianBlur(work, ksize)
+    elif method == 'bilateral':
+        out = cv2.bilateralFilter(work, diameter, sigma, sigma)
+    elif method == 'nlmeans':
+        out = cv2.fastNlMeansDenoising(work, None, strength) if work.ndim == 2 else \
+            cv2.fastNlMeansDenoisingColored(work, None, strength, strength)
+    else:
+        raise ValueError(f"Unknown denoise method: {method}")
+
+    if out.shape[:2] != (height, width):
+        out = cv2.resize(out, (width, height), interpolation=cv2.INTER_LINEAR)
+    return out
+
+def clahe(img: np.ndarray, clip_limit: float = 2.0, tile_grid: int = 8) -> np.ndarray:
+    """Local contrast enhancement"""
+    return cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid)).apply(_grayscale(img))
+
+def binarize(img: np.ndarray, method: str = 'otsu', block_size: int = 31, offset: float = 15) -> np.ndarray:
+    """Black text on white background"""
+    gray = _grayscale(img)
+    if method == 'adaptive':
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                     block_size, offset)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+STEPS = {
+    'grayscale': grayscale,
+    'deskew': deskew,
+    'denoise': denoise,
+    'clahe': clahe,
+    'binarize': binarize
+}
+
+def _parse_step(step: Union[str, Dict]) -> tuple:
+    if isinstance(step, str):
+        return step, {}
+    params = dict(step)
+    return params.pop('step'), params
+
+def get_pipeline(band: str) -> List[Union[str, Dict]]:
+    """Configured steps for a quality band"""
+    return PREPROCESS_PIPELINES.get(band, [])
+
+def pipeline_signature(steps: List[Union[str, Dict]]) -> str:
+    """Short stable hash of a pipeline definition, used in output file names"""
+    return hashlib.sha256(json.dumps(steps, sort_keys=True).encode()).hexdigest()[:10]
+
+def run_pipeline(img: np.ndarray, steps: List[Union[str, Dict]]) -> np.ndarray:
+    """Apply steps in order"""
+    for step in steps:
+        name, params = _parse_step(step)
+        if name not in STEPS:
+            raise ValueError(f"Unknown preprocessing step: {name}")
+        img = STEPS[name](img, **params)
+    return img
+
+def preprocessed_path(source_path: str, page_number: int, band: str, steps: List[Union[str, Dict]],
+                      render_dpi: Optional[int] = None) -> str:
+    """Where the preprocessed version of a page is stored"""
+    root, _ = os.path.splitext(source_path)
+    if render_dpi is not None:
+        page = f"_page{page_number}_{render_dpi}dpi"
+    else:
+        # Frames of a multi-page image file; single images keep the plain name
+        page = f"_page{page_number}" if page_number != 1 else ''
+    return f"{root}{page}_{band}_{pipeline_signature(steps)}.png"
+
+def load_or_preprocess(img: np.ndarray, band: str, source_path: Optional[str] = None,
+                       page_number: int = 1, render_dpi: Optional[int] = None,
+                       save: bool = None) -> tuple:
+    """Return (preprocessed image, stored path), reusing a stored result when present"""
+    if save is None:
+        save = OCR_PREPROCESS_SAVE
+    steps = get_pipeline(band)
+    if not steps:
+        return img, None
+
+    path = preprocessed_path(source_path, page_number, band, steps, render_dpi) if source_path else None
+    if path and os.path.exists(path):
+        cached = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if cached is not None:
+            return cached, path
+
+    out = run_pipeline(img, steps)
+    if path and save:
+        # PNG: lossless, and binarized pages compress to almost nothing
+        if cv2.imwrite(path, out):
+            return out, path
+        print(f"Failed to write preprocessed page: {path}")
+    return out, None
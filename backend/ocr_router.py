@@ -0,0 +1,305 @@
+"""
+OCR engine registry and cost-model routing
+Engines register what they can do plus prior latency/confidence figures. The
+router ranks them per quality band from rolling stats measured in this process,
+and each tenant can shift the trade-off through a routing policy stored in
+SystemConfig ("ocr_routing" globally, "ocr_routing.tenant.<id>" per tenant).
+"""
+
+import os
+import threading
+import importlib.util
+from collections import deque
+from typing import Callable, Dict, List, Optional, Union
+
+# Rolling window of runs kept per engine and per (engine, quality band)
+ENGINE_STATS_WINDOW = int(os.getenv('OCR_ENGINE_STATS_WINDOW', '200'))
+# Weight of the registered prior, in runs, when blending it with measured stats
+ENGINE_PRIOR_WEIGHT = 5
+# Every this many pages of a band, one engine the estimates keep out of that band is run
+# as well, so an estimate that has gone stale is measured again (0 disables)
+ENGINE_PROBE_INTERVAL = int(os.getenv('OCR_ENGINE_PROBE_INTERVAL', '25'))
+
+# Defaults for tenants without a routing policy
+# Routing mode: 'all' runs every engine selected for the quality band,
+# 'cascade' runs them in ranked order and stops once one is confident enough
+OCR_ROUTING_MODE = os.getenv('OCR_ROUTING_MODE', 'all')
+OCR_CASCADE_CONFIDENCE = float(os.getenv('OCR_CASCADE_CONFIDENCE', '0.90'))
+OCR_LATENCY_WEIGHT = float(os.getenv('OCR_LATENCY_WEIGHT', '0.05'))
+# Born-digital PDFs: use the embedded text layer instead of rasterizing and OCR'ing
+OCR_PDF_TEXT_LAYER = os.getenv('OCR_PDF_TEXT_LAYER', 'true').lower() == 'true'
+# Near-duplicate pages: only 'flag' them, 'reuse' the stored OCR result of a verified match, or 'off'
+OCR_DEDUP = os.getenv('OCR_DEDUP', 'flag')
+# Largest Hamming distance (of 256 perceptual-hash bits) still counted as the same page
+OCR_DEDUP_MAX_DISTANCE = int(os.getenv('OCR_DEDUP_MAX_DISTANCE', '16'))
+
+ROUTING_CONFIG_KEY = 'ocr_routing'
+
+# Defaults for every policy field; SystemConfig values override them key by key
+DEFAULT_POLICY = {
+    # Quality score cut-offs between the low/medium/high bands
+    'high_threshold': 0.85,
+    'medium_threshold': 0.60,
+    'mode': OCR_ROUTING_MODE,
+    'cascade_confidence': OCR_CASCADE_CONFIDENCE,
+    # Engines this tenant may use (None: every available engine)
+    'engines': None,
+    # How many engines run per page in each band
+    'max_engines': {'high': 2, 'medium': 2, 'low': 3},
+    # Confidence points given up per second of expected latency: 0 buys accuracy
+    # regardless of cost, larger values favour throughput
+    'latency_weight': OCR_LATENCY_WEIGHT,
+    # Use an embedded PDF text layer instead of OCR when it is complete
+    'pdf_text_layer': OCR_PDF_TEXT_LAYER,
+    'dedup': OCR_DEDUP,
+    'dedup_max_distance': OCR_DEDUP_MAX_DISTANCE
+}
+
+class EngineSpec:
+    """An OCR engine and its capabilities"""
+
+    def __init__(self, name: str, runner: Union[str, Callable], inputs: tuple = ('image',),
+                 capabilities: tuple = (), prior_confidence: float = 0.8, prior_latency: float = 1.0,
+                 module: Optional[str] = None):
+        self.name = name
+        # OCREngine method name, or callable(ocr_engine, image) -> result dict
+        self.runner = runner
+        self.inputs = inputs
+        self.capabilities = capabilities
+        self.prior_confidence = prior_confidence
+        self.prior_latency = prior_latency
+        # Python module the engine needs; checked once, without importing it
+        self.module = module
+        self._available = None
+
+    def is_available(self) -> bool:
+        if self._available is None:
+            self._available = self.module is None or importlib.util.find_spec(self.module) is not None
+        return self._available
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'inputs': list(self.inputs),
+            'capabilities': list(self.capabilities),
+            'prior_confidence': self.prior_confidence,
+            'prior_latency': self.prior_latency,
+            'available': self.is_available()
+        }
+
+_registry: Dict[str, EngineSpec] = {}
+
+def register_engine(spec: EngineSpec):
+    """Add (or replace) an engine in the registry"""
+    _registry[spec.name] = spec
+
+def get_engine_spec(name: str) -> EngineSpec:
+    if name not in _registry:
+        raise Exception(f"Unknown OCR engine: {name}")
+    return _registry[name]
+
+def list_engines(input_type: str = 'image') -> List[EngineSpec]:
+    """Registered and installed engines that accept input_type"""
+    return [spec for spec in _registry.values() if input_type in spec.inputs and spec.is_available()]
+
+def describe_engines() -> List[Dict]:
+    """Every registered engine with its capabilities and availability"""
+    return [spec.to_dict() for spec in _registry.values()]
+
+def engine_allowed(name: str, policy: Optional[Dict] = None) -> bool:
+    """Whether an engine is installed and permitted by the policy"""
+    allowed = (policy or DEFAULT_POLICY)['engines']
+    return name in _registry and _registry[name].is_available() and (allowed is None or name in allowed)
+
+register_engine(EngineSpec('tesseract', 'run_tesseract', capabilities=('words', 'boxes', 'multilingual'),
+                           prior_confidence=0.80, prior_latency=1.0, module='pytesseract'))
+register_engine(EngineSpec('rapidocr', 'run_rapidocr', capabilities=('lines', 'boxes', 'batching'),
+                           prior_confidence=0.85, prior_latency=1.5, module='rapidocr_onnxruntime'))
+register_engine(EngineSpec('paddleocr', 'run_paddleocr', capabilities=('lines', 'boxes', 'low_quality'),
+                           prior_confidence=0.85, prior_latency=5.0, module='paddleocr'))
+register_engine(EngineSpec('pdf_text', 'run_pdf_text', inputs=('pdf',), capabilities=('exact_text', 'boxes'),
+                           prior_confidence=1.0, prior_latency=0.05, module='pypdfium2'))
+
+class EngineStats:
+    """Rolling latency and confidence per engine, overall and per quality band"""
+
+    def __init__(self, window: int = ENGINE_STATS_WINDOW):
+        self.window = window
+        self._runs = {}
+        # Sequence number of the last run per (engine, band), and pages routed per band
+        self._last_run = {}
+        self._sequence = 0
+        self._band_pages = {}
+        self._lock = threading.Lock()
+
+    def record(self, engine: str, latency: float, confidence: float, band: Optional[str] = None):
+        """Add a run; failed and timed-out runs count with confidence 0"""
+        with self._lock:
+            self._sequence += 1
+            for key in ((engine, None), (engine, band)) if band else ((engine, None),):
+                self._runs.setdefault(key, deque(maxlen=self.window)).append((latency, confidence))
+                self._last_run[key] = self._sequence
+
+    def last_run(self, engine: str, band: Optional[str] = None) -> int:
+        """Sequence number of the engine's latest run in the band (0 if never run)"""
+        with self._lock:
+            return self._last_run.get((engine, band), 0)
+
+    def probe_due(self, band: str, interval: int = None) -> bool:
+        """Count a routed page in the band; True on every interval-th page"""
+        if interval is None:
+            interval = ENGINE_PROBE_INTERVAL
+        if interval <= 0:
+            return False
+        with self._lock:
+            self._band_pages[band] = self._band_pages.get(band, 0) + 1
+            return self._band_pages[band] % interval == 0
+
+    def _blend(self, runs: List, prior_latency: float, prior_confidence: float) -> tuple:
+        """Mean of runs pulled towards the prior while there are only a few"""
+        n = len(runs)
+        latency = (prior_latency * ENGINE_PRIOR_WEIGHT + sum(r[0] for r in runs)) / (ENGINE_PRIOR_WEIGHT + n)
+        confidence = (prior_confidence * ENGINE_PRIOR_WEIGHT + sum(r[1] for r in runs)) / (ENGINE_PRIOR_WEIGHT + n)
+        return latency, confidence
+
+    def estimate(self, engine: str, band: Optional[str] = None) -> Dict:
+        """Expected latency (s) and confidence of an engine, for a band if given"""
+        spec = _registry.get(engine)
+        prior_latency = spec.prior_latency if spec else 1.0
+        prior_confidence = spec.prior_confidence if spec else 0.5
+
+        with self._lock:
+            overall = list(self._runs.get((engine, None), ()))
+            in_band = list(self._runs.get((engine, band), ())) if band else []
+
+        latency, confidence = self._blend(overall, prior_latency, prior_confidence)
+        if band:
+            # Band-specific confidence, falling back to the engine's overall figures
+            _, confidence = self._blend(in_band, latency, confidence)
+        return {'latency': latency, 'confidence': confidence, 'samples': len(in_band) if band else len(overall)}
+
+    def snapshot(self) -> Dict:
+        """Current estimates for every engine seen, for health/monitoring"""
+        with self._lock:
+            keys = list(self._runs)
+        snapshot = {}
+        for engine, band in keys:
+            estimate = self.estimate(engine, band)
+            snapshot.setdefault(engine, {})[band or 'all'] = {
+                'latency': round(estimate['latency'], 4),
+                'confidence': round(estimate['confidence'], 4),
+                'samples': estimate['samples']
+            }
+        return snapshot
+
+ROUTING_MODES = ('all', 'cascade')
+DEDUP_MODES = ('reuse', 'flag', 'off')
+
+def _validate_policy_value(key: str, value):
+    """The value if it is usable for key, else None (the default is kept)"""
+    if key == 'engines':
+        if not isinstance(value, (list, tuple)):
+            return None
+        unknown = [name for name in value if name not in _registry]
+        if unknown:
+            print(f"Routing policy: dropping unknown OCR engine(s) {unknown}")
+        known = [name for name in value if name in _registry]
+        # Pages that need OCR must still have an image engine to go to
+        return known if any('image' in _registry[name].inputs for name in known) else None
+    if key == 'mode':
+        return value if value in ROUTING_MODES else None
+    if key == 'dedup':
+        return value if value in DEDUP_MODES else None
+    if key == 'max_engines':
+        bands = DEFAULT_POLICY['max_engines']
+        try:
+            if isinstance(value, dict):
+                return {band: int(n) for band, n in value.items() if band in bands}
+            return {band: int(value) for band in bands}
+        except (TypeError, ValueError):
+            return None
+    if isinstance(DEFAULT_POLICY[key], bool):
+        return value if isinstance(value, bool) else None
+    if isinstance(DEFAULT_POLICY[key], (int, float)):
+        return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    return value
+
+def resolve_policy(policy: Optional[Dict] = None) -> Dict:
+    """Fill a partial policy with defaults, dropping entries that are invalid"""
+    resolved = dict(DEFAULT_POLICY)
+    resolved['max_engines'] = dict(DEFAULT_POLICY['max_engines'])
+    for key, value in (policy or {}).items():
+        if key not in resolved:
+            continue
+        valid = _validate_policy_value(key, value)
+        if valid is None:
+            if value is not None:
+                print(f"Routing policy: ignoring invalid {key}={value!r}, using the default")
+            continue
+        if key == 'max_engines':
+            resolved['max_engines'].update(valid)
+        else:
+            resolved[key] = valid
+    return resolved
+
+def quality_band(score: float, policy: Optional[Dict] = None) -> str:
+    """'high', 'medium' or 'low' for a quality score"""
+    policy = policy or DEFAULT_POLICY
+    if score > policy['high_threshold']:
+        return 'high'
+    if score > policy['medium_threshold']:
+        return 'medium'
+    return 'low'
+
+def engine_score(estimate: Dict, latency_weight: float) -> float:
+    """Expected confidence minus the policy's price on latency"""
+    return estimate['confidence'] - latency_weight * estimate['latency']
+
+def select_engines(band: str, stats: EngineStats, policy: Optional[Dict] = None,
+                   admit: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """Image engines to run for a band, best expected trade-off first"""
+    policy = resolve_policy(policy)
+    candidates = [spec.name for spec in list_engines('image') if engine_allowed(spec.name, policy)]
+    if admit is not None:
+        # Runtime check, e.g. whether a lazily loaded engine fits in memory right now
+        candidates = [name for name in candidates if admit(name)] or candidates[:1]
+    if not candidates:
+        raise Exception("No OCR engine available for routing policy")
+
+    ranked = sorted(candidates, key=lambda name: engine_score(stats.estimate(name, band), policy['latency_weight']),
+                    reverse=True)
+    return ranked[:max(1, int(policy['max_engines'].get(band, len(ranked))))]
+
+def probe_engine(band: str, selected: List[str], stats: EngineStats, policy: Optional[Dict] = None,
+                 admit: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+    """An engine left out of the selection to run as well on this page, when a re-probe is due
+
+    Engines outside max_engines are never run, so their estimates would never
+    change; periodically the one not run in this band for longest is measured again.
+    """
+    if not stats.probe_due(band):
+        return None
+    policy = resolve_policy(policy)
+    excluded = [spec.name for spec in list_engines('image')
+                if spec.name not in selected and engine_allowed(spec.name, policy)
+                and (admit is None or admit(spec.name))]
+    if not excluded:
+        return None
+    return min(excluded, key=lambda name: stats.last_run(name, band))
+
+def get_routing_policy(db, tenant_id: Optional[int] = None) -> Dict:
+    """Global routing policy merged with the tenant's overrides, from SystemConfig"""
+    from models import SystemConfig
+
+    keys = [ROUTING_CONFIG_KEY]
+    if tenant_id is not None:
+        keys.append(f"{ROUTING_CONFIG_KEY}.tenant.{tenant_id}")
+    configs = {c.config_key: c.config_value for c in
+               db.query(SystemConfig).filter(SystemConfig.config_key.in_(keys)).all()}
+
+    policy = {}
+    for key in keys:
+        value = configs.get(key)
+        if isinstance(value, dict):
+            policy.update(value)
+    return resolve_policy(policy)
@@ -0,0 +1,177 @@
+"""
+Spatial index over a page's OCR boxes
+Boxes are bucketed into a uniform grid sized from the page's median text
+height. The buckets are stored CSR-style (box ids sorted by cell plus one
+offset per cell), so a region or point query only touches the few cells it
+covers and then runs an exact rectangle test on those candidates with numpy.
+Indexes are built once per stored OCR result and kept in a small in-process LRU.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+import numpy as np
+from ocr_boxes import BoxArray
+
+# Page indexes kept in memory per process
+OCR_SPATIAL_CACHE_ITEMS = int(os.getenv('OCR_SPATIAL_CACHE_ITEMS', '256'))
+
+# Grid cell side in units of the median box height
+CELL_HEIGHTS = 4.0
+# Upper bound on grid cells per page; the cell side grows on huge pages instead
+MAX_CELLS = 16384
+
+QUERY_MODES = ('intersects', 'contains', 'centre')
+
+class SpatialIndex:
+    """Uniform grid over the axis-aligned rects of a BoxArray"""
+
+    def __init__(self, boxes: BoxArray, cell_size: float = None):
+        self.boxes = BoxArray.from_any(boxes)
+        self.rects = self.boxes.rects()
+        count = len(self.rects)
+
+        if cell_size is None:
+            unit = float(np.median(self.rects[:, 3] - self.rects[:, 1])) if count else 1.0
+            cell_size = CELL_HEIGHTS * max(unit, 1.0)
+        extent_x = float(self.rects[:, 2].max()) if count else 0.0
+        extent_y = float(self.rects[:, 3].max()) if count else 0.0
+        # Coarsen the grid until it fits the cell budget
+        while (extent_x / cell_size + 1) * (extent_y / cell_size + 1) > MAX_CELLS:
+            cell_size *= 2
+        self.cell_size = cell_size
+        self.cols = int(extent_x // cell_size) + 1
+        self.rows = int(extent_y // cell_size) + 1
+
+        # Every box is listed in each cell its rect touches
+        x0, y0, x1, y1 = (self._cell(self.rects[:, i], limit) for i, limit in
+                          ((0, self.cols), (1, self.rows), (2, self.cols), (3, self.rows)))
+        widths, heights = x1 - x0 + 1, y1 - y0 + 1
+        box_ids = np.repeat(np.arange(count), widths * heights)
+        # Position of each entry within its box's block of cells
+        within = np.arange(len(box_ids)) - np.repeat(np.cumsum(widths * heights) - widths * heights,
+                                                     widths * heights)
+        cell_ids = (y0[box_ids] + within // widths[box_ids]) * self.cols + x0[box_ids] + within % widths[box_ids]
+
+        order = np.argsort(cell_ids, kind='stable')
+        self.cell_boxes = box_ids[order]
+        self.cell_offsets = np.searchsorted(cell_ids[order], np.arange(self.rows * self.cols + 1))
+
+    def __len__(self) -> int:
+        return len(self.rects)
+
+    def _cell(self, values, limit: int) -> np.ndarray:
+        return np.clip((np.asarray(values) // self.cell_size).astype(np.int64), 0, limit - 1)
+
+    def _candidates(self, x1: float, y1: float, x2: float, y2: float) -> np.ndarray:
+        """Boxes listed in any cell the rectangle touches (a superset of the hits)"""
+        if not len(self.rects) or x2 < 0 or y2 < 0:
+            return np.zeros(0, np.int64)
+        cx0, cx1 = self._cell([x1, x2], self.cols)
+        cy0, cy1 = self._cell([y1, y2], self.rows)
+        # Cells of one grid row are contiguous, so each row is a single slice
+        starts = self.cell_offsets[np.arange(cy0, cy1 + 1) * self.cols + cx0]
+        ends = self.cell_offsets[np.arange(cy0, cy1 + 1) * self.cols + cx1 + 1]
+        return np.unique(np.concatenate([self.cell_boxes[a:b] for a, b in zip(starts, ends)]))
+
+    def query_region(self, x1: float, y1: float, x2: float, y2: float, mode: str = 'intersects') -> np.ndarray:
+        """Indices of boxes that intersect, lie inside, or have their centre inside the rectangle"""
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Unknown region query mode: {mode}")
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        ids = self._candidates(x1, y1, x2, y2)
+        rects = self.rects[ids]
+        if mode == 'intersects':
+            hit = (rects[:, 0] <= x2) & (rects[:, 2] >= x1) & (rects[:, 1] <= y2) & (rects[:, 3] >= y1)
+        elif mode == 'contains':
+            hit = (rects[:, 0] >= x1) & (rects[:, 2] <= x2) & (rects[:, 1] >= y1) & (rects[:, 3] <= y2)
+        else:
+            cx, cy = (rects[:, 0] + rects[:, 2]) / 2, (rects[:, 1] + rects[:, 3]) / 2
+            hit = (cx >= x1) & (cx <= x2) & (cy >= y1) & (cy <= y2)
+        return ids[hit]
+
+    def query_point(self, x: float, y: float, radius: float = 0.0) -> np.ndarray:
+        """Indices of boxes within radius of the point, nearest first (0 = boxes containing it)"""
+        ids = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        rects = self.rects[ids]
+        # Distance from the point to each rect (0 inside)
+        dx = np.maximum(np.maximum(rects[:, 0] - x, x - rects[:, 2]), 0)
+        dy = np.maximum(np.maximum(rects[:, 1] - y, y - rects[:, 3]), 0)
+        distance = np.hypot(dx, dy)
+        keep = np.flatnonzero(distance <= radius)
+        return ids[keep[np.argsort(distance[keep], kind='stable')]]
+
+    def stats(self) -> Dict:
+        return {'boxes': len(self.rects), 'grid': [self.cols, self.rows],
+                'cell_size': round(self.cell_size, 1), 'entries': len(self.cell_boxes)}
+
+def region_rect(region: Dict, width: int, height: int, padding: float = 0.0) -> Tuple[float, float, float, float]:
+    """Pixel rectangle of a normalized {'x', 'y', 'width', 'height'} field region"""
+    return ((region['x'] - padding) * width, (region['y'] - padding) * height,
+            (region['x'] + region['width'] + padding) * width, (region['y'] + region['height'] + padding) * height)
+
+def fields_from_index(index: SpatialIndex, regions: Dict[str, Dict], width: int, height: int,
+                      padding: float = 0.0) -> Dict[str, Dict]:
+    """Text and mean confidence of the boxes centred in each normalized field region"""
+    from ocr_layout import layout_text
+
+    fields = {}
+    for field_name, region in regions.items():
+        subset = index.boxes.take(index.query_region(*region_rect(region, width, height, padding), mode='centre'))
+        fields[field_name] = {'text': layout_text(subset), 'confidence': subset.mean_confidence()}
+    return fields
+
+class SpatialIndexCache:
+    """LRU of built page indexes, keyed by the stored OCR result they were built from"""
+
+    def __init__(self, max_items: int = OCR_SPATIAL_CACHE_ITEMS):
+        self.max_items = max_items
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'build_time': 0.0}
+
+    def get(self, key: Hashable, load: Callable[[], BoxArray]) -> SpatialIndex:
+        """Cached index for key, built from load() on a miss"""
+        with self._lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._indexes[key]
+            self._stats['misses'] += 1
+
+        start_time = time.time()
+        # Built outside the lock; two concurrent misses just build it twice
+        index = SpatialIndex(load())
+        with self._lock:
+            self._stats['build_time'] += time.time() - start_time
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_items:
+                self._indexes.popitem(last=False)
+                self._stats['evictions'] += 1
+        return index
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'build_time': round(self._stats['build_time'], 4),
+                'lookups': lookups,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'items': len(self._indexes)
+            }
+
+_cache: Optional[SpatialIndexCache] = None
+_cache_lock = threading.Lock()
+
+def get_spatial_cache() -> SpatialIndexCache:
+    """Process-wide index cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SpatialIndexCache()
+        return _cache
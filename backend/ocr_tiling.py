@@ -0,0 +1,127 @@
+"""
+Tile geometry and seam merging for tiled OCR of very large pages
+Text lines that cross a vertical seam come back as two clipped fragments
+(one per tile) and are stitched together; lines cut by a horizontal seam are
+dropped because the overlap guarantees the neighbouring tile saw them whole.
+"""
+
+from typing import Iterator, List, Tuple
+import numpy as np
+from ocr_boxes import BoxArray
+
+# A box closer than this (or half its own height) to an interior tile edge was cut off by the tile
+CLIP_MARGIN = 3
+
+def iter_tiles(width: int, height: int, tile_size: int, overlap: int) -> Iterator[Tuple[int, int, int, int]]:
+    """Overlapping tile rectangles (x0, y0, x1, y1) covering the page"""
+    step = max(tile_size - overlap, 1)
+    for y0 in range(0, max(height - overlap, 1), step):
+        for x0 in range(0, max(width - overlap, 1), step):
+            yield x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height)
+
+def _overlap_ratio(a: Tuple, b: Tuple) -> float:
+    """Intersection area over the smaller box's area"""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return ix * iy / smaller if smaller > 0 else 0.0
+
+def _vertical_overlap(a: Tuple, b: Tuple) -> float:
+    overlap = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    shorter = min(a[3] - a[1], b[3] - b[1])
+    return overlap / shorter if shorter > 0 else 0.0
+
+def _merge_text(left: str, right: str, left_rect: Tuple, right_rect: Tuple) -> str:
+    """Join two fragments of one text line that overlap across a seam"""
+    # The glyph cut by each tile edge is often misread, so also try without it
+    for left_trim, right_trim in ((0, 0), (1, 0), (0, 1), (1, 1)):
+        head = left[:len(left) - left_trim]
+        tail = right[right_trim:]
+        for k in range(min(len(head), len(tail)), 2, -1):
+            if head.endswith(tail[:k]):
+                return head + tail[k:]
+
+    # OCR disagreed inside the overlap: drop right-hand characters that fall inside it
+    overlap_px = max(0.0, left_rect[2] - right_rect[0])
+    width = right_rect[2] - right_rect[0]
+    drop = int(round(len(right) * overlap_px / width)) if width > 0 else 0
+    return (left + right[drop:]) if drop else f"{left} {right}"
+
+def merge_tile_boxes(tile_boxes: List[Tuple[Tuple[int, int, int, int], BoxArray]],
+                     width: int, height: int) -> BoxArray:
+    """Combine per-tile boxes (already in page coordinates) into one de-duplicated set"""
+    candidates = []
+    left_fragments = []   # cut by the right edge of their tile
+    right_fragments = []  # cut by the left edge of their tile
+
+    for (x0, y0, x1, y1), boxes in tile_boxes:
+        if not len(boxes):
+            continue
+        rects = boxes.rects()
+        margin = np.maximum(CLIP_MARGIN, (rects[:, 3] - rects[:, 1]) / 2)
+        cut_top = (rects[:, 1] <= y0 + margin) if y0 > 0 else np.zeros(len(rects), bool)
+        cut_bottom = (rects[:, 3] >= y1 - margin) if y1 < height else np.zeros(len(rects), bool)
+        cut_left = (rects[:, 0] <= x0 + margin) if x0 > 0 else np.zeros(len(rects), bool)
+        cut_right = (rects[:, 2] >= x1 - margin) if x1 < width else np.zeros(len(rects), bool)
+
+        # Lines cut by a horizontal seam are skipped: the vertical neighbour has them whole
+        for i in np.flatnonzero(~(cut_top | cut_bottom)):
+            entry = [tuple(rects[i].tolist()), boxes.texts[i], float(boxes.confidences[i])]
+            if cut_right[i] and not cut_left[i]:
+                left_fragments.append(entry)
+            elif cut_left[i] and not cut_right[i]:
+                right_fragments.append(entry)
+            else:
+                # Whole boxes, and middles of lines spanning three or more tiles
+                candidates.append(entry)
+
+    # Stitch fragments that meet in a seam, chaining lines that span several tiles
+    left_fragments.sort(key=lambda e: e[0][0])
+    right_fragments.sort(key=lambda e: e[0][0])
+    used = set()
+    for left in left_fragments:
+        merged = True
+        while merged:
+            merged = False
+            for i, right in enumerate(right_fragments):
+                if i in used:
+                    continue
+                l_rect, r_rect = left[0], right[0]
+                if r_rect[0] < l_rect[2] and r_rect[2] > l_rect[2] and _vertical_overlap(l_rect, r_rect) > 0.5:
+                    left[1] = _merge_text(left[1], right[1], l_rect, r_rect)
+                    left[0] = (min(l_rect[0], r_rect[0]), min(l_rect[1], r_rect[1]),
+                               max(l_rect[2], r_rect[2]), max(l_rect[3], r_rect[3]))
+                    left[2] = min(left[2], right[2])
+                    used.add(i)
+                    merged = True
+                    break
+        candidates.append(left)
+    candidates.extend(r for i, r in enumerate(right_fragments) if i not in used)
+
+    # Same text seen whole by two tiles, or a stray fragment of a kept line: keep the larger box
+    candidates.sort(key=lambda e: (e[0][2] - e[0][0]) * (e[0][3] - e[0][1]), reverse=True)
+    kept = []
+    for entry in candidates:
+        if any(_overlap_ratio(entry[0], other[0]) > 0.5 for other in kept):
+            continue
+        kept.append(entry)
+
+    kept = _reading_order(kept)
+    if not kept:
+        return BoxArray.empty()
+    return BoxArray.from_rects([e[0] for e in kept], [e[1] for e in kept], [e[2] for e in kept])
+
+def _reading_order(entries: List) -> List:
+    """Top-to-bottom lines, left-to-right within a line"""
+    entries = sorted(entries, key=lambda e: (e[0][1] + e[0][3]) / 2)
+    ordered = []
+    line = []
+    for entry in entries:
+        if line:
+            first = line[0][0]
+            if (entry[0][1] + entry[0][3]) / 2 - (first[1] + first[3]) / 2 > (first[3] - first[1]) / 2:
+                ordered.extend(sorted(line, key=lambda e: e[0][0]))
+                line = []
+        line.append(entry)
+    ordered.extend(sorted(line, key=lambda e: e[0][0]))
+    return ordered
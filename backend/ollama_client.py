@@ -0,0 +1,174 @@
+"""
+Pooled async HTTP client for the local Ollama server
+One httpx.AsyncClient, and with it one keep-alive connection pool, serves the
+whole process. It lives on a private event loop in a daemon thread, so async
+routes await it from the server's loop and synchronous callers (document
+processing in the threadpool, Celery tasks) block on a Future, and both share
+the same connections. Generation requests are capped by a semaphore so a burst
+of documents queues here instead of piling onto the model server.
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+import httpx
+
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+# Pool size and how long idle keep-alive connections are held open
+OLLAMA_MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', '8'))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv('OLLAMA_KEEPALIVE_EXPIRY', '60'))
+# Generation requests in flight at once (Ollama runs OLLAMA_NUM_PARALLEL per model)
+OLLAMA_CONCURRENCY = int(os.getenv('OLLAMA_CONCURRENCY', '2'))
+# Seconds: connecting, waiting for a generation, and status/model-list calls
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '2'))
+OLLAMA_TIMEOUT = float(os.getenv('OLLAMA_TIMEOUT', '120'))
+OLLAMA_STATUS_TIMEOUT = float(os.getenv('OLLAMA_STATUS_TIMEOUT', '2'))
+
+class OllamaClient:
+    """Shared connection pool to one Ollama server, usable from sync and async code"""
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, max_connections: int = OLLAMA_MAX_CONNECTIONS,
+                 concurrency: int = OLLAMA_CONCURRENCY, timeout: float = OLLAMA_TIMEOUT,
+                 connect_timeout: float = OLLAMA_CONNECT_TIMEOUT, keepalive_expiry: float = OLLAMA_KEEPALIVE_EXPIRY):
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_expiry = keepalive_expiry
+
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'errors': 0, 'in_flight': 0, 'queued': 0}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='ollama-client', daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def _connect(self):
+        """Create the pool on the client loop (asyncio objects belong to the loop that made them)"""
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections,
+                                keepalive_expiry=self.keepalive_expiry),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def _send(self, method: str, path: str, limited: bool, timeout: Optional[float], **kwargs) -> httpx.Response:
+        if self._client is None:
+            self._connect()
+        options = {} if timeout is None else {'timeout': httpx.Timeout(timeout, connect=self.connect_timeout)}
+
+        async def send():
+            self._stats['in_flight'] += 1
+            try:
+                return await self._client.request(method, path, **options, **kwargs)
+            except Exception:
+                self._stats['errors'] += 1
+                raise
+            finally:
+                self._stats['in_flight'] -= 1
+                self._stats['requests'] += 1
+
+        if not limited:
+            return await send()
+        self._stats['queued'] += 1
+        async with self._semaphore:
+            self._stats['queued'] -= 1
+            return await send()
+
+    def submit(self, method: str, path: str, limited: bool = False, timeout: float = None, **kwargs) -> Future:
+        """Start a request on the client loop; the future resolves to the (fully read) response"""
+        return asyncio.run_coroutine_threadsafe(self._send(method, path, limited, timeout, **kwargs),
+                                                self._ensure_loop())
+
+    async def request(self, method: str, path: str, limited: bool = False, timeout: float = None,
+                      **kwargs) -> httpx.Response:
+        """Await a request from any event loop"""
+        return await asyncio.wrap_future(self.submit(method, path, limited, timeout, **kwargs))
+
+    def request_sync(self, method: str, path: str, limited: bool = False, timeout: float = None,
+                     **kwargs) -> httpx.Response:
+        """Block the calling thread until the request completes"""
+        return self.submit(method, path, limited, timeout, **kwargs).result()
+
+    @staticmethod
+    def _json(response: httpx.Response) -> Dict:
+        if response.status_code != 200:
+            raise Exception(f"Ollama error {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def _generate_body(self, model: str, prompt: str, format: Optional[str], options: Dict) -> Dict:
+        body = {'model': model, 'prompt': prompt, 'stream': False, **options}
+        if format is not None:
+            body['format'] = format
+        return body
+
+    async def list_models(self, timeout: float = OLLAMA_STATUS_TIMEOUT) -> List[Dict]:
+        """Installed models (GET /api/tags)"""
+        return self._json(await self.request('GET', '/api/tags', timeout=timeout)).get('models', [])
+
+    def list_models_sync(self, timeout: float = OLLAMA_STATUS_TIMEOUT) -> List[Dict]:
+        return self._json(self.request_sync('GET', '/api/tags', timeout=timeout)).get('models', [])
+
+    async def generate(self, model: str, prompt: str, format: str = None, timeout: float = None,
+                       **options) -> Dict:
+        """One non-streaming completion (POST /api/generate), subject to the concurrency cap"""
+        response = await self.request('POST', '/api/generate', limited=True, timeout=timeout,
+                                      json=self._generate_body(model, prompt, format, options))
+        return self._json(response)
+
+    def generate_sync(self, model: str, prompt: str, format: str = None, timeout: float = None,
+                      **options) -> Dict:
+        response = self.request_sync('POST', '/api/generate', limited=True, timeout=timeout,
+                                     json=self._generate_body(model, prompt, format, options))
+        return self._json(response)
+
+    def stats(self) -> Dict:
+        # Counters are only written on the client loop; reads here are for reporting
+        return {**self._stats, 'base_url': self.base_url, 'concurrency': self.concurrency,
+                'max_connections': self.max_connections, 'connected': self._client is not None}
+
+    def close(self):
+        """Close pooled connections and stop the client loop"""
+        with self._lock:
+            loop, thread, self._loop, self._thread = self._loop, self._thread, None, None
+        if loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_ollama_client() -> OllamaClient:
+    """Process-wide client instance"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+def close_ollama_client():
+    """Release the shared pool if it was created"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
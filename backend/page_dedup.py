@@ -0,0 +1,270 @@
+"""
+Near-duplicate page detection
+Faxed and re-scanned copies of a page are never byte-identical, so pages are
+also keyed by a 256-bit perceptual hash of the upright page: low-frequency DCT
+coefficients of a 96x96 thumbnail framed on the centroid and spread of its
+ink, so re-scans shifted on the scanner bed hash alike. Each tenant's processed
+pages form an index searched by Hamming distance; a page close enough to a
+stored one is flagged as its duplicate.
+
+Copies of one form template filled in differently are only a little further
+apart than re-scans of the same copy, and a changed character or two cannot be
+told apart at all, so a hash match alone never reuses anything. In 'reuse'
+mode the stored OCR is taken only when the decoded pixels are identical (same
+content hash) or when the engine that produced it reads the same text from
+this page; extracted fields are copied only between exact copies.
+"""
+
+import os
+import re
+import difflib
+import threading
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+# Word-level similarity a cheap OCR read must reach against the stored text
+OCR_DEDUP_MIN_TEXT_SIMILARITY = float(os.getenv('OCR_DEDUP_MIN_TEXT_SIMILARITY', '0.97'))
+
+HASH_SIDE = 96
+# Low-frequency DCT block kept for the hash (16x16 = 256 bits)
+HASH_BLOCK = 16
+HASH_WORDS = HASH_BLOCK * HASH_BLOCK // 64
+# Working resolution for locating the ink
+HASH_WORK_SIDE = 512
+# Half-width of the hashed window, in standard deviations of the ink around its centroid
+HASH_SPREAD = 2.0
+
+def _ink_frame(gray: np.ndarray) -> tuple:
+    """Centroid and spread (cx, cy, sx, sy) of the page's ink, weighted by darkness
+
+    Moments of the ink move smoothly with the page, unlike a bounding box, whose
+    edges jump when a thin rule or a speck at the margin appears or vanishes.
+    """
+    paper = float(np.percentile(gray, 90))
+    # Darkness is preserved by area downscaling, so thin rules weigh the same at any phase
+    ink = np.clip(paper - 8 - gray, 0, None)
+    moments = cv2.moments(ink)
+    height, width = gray.shape[:2]
+    if moments['m00'] <= 0:
+        return width / 2, height / 2, width / 4, height / 4
+    cx, cy = moments['m10'] / moments['m00'], moments['m01'] / moments['m00']
+    sx, sy = np.sqrt(moments['mu20'] / moments['m00']), np.sqrt(moments['mu02'] / moments['m00'])
+    return cx, cy, max(sx, 4.0), max(sy, 4.0)
+
+def page_hash(img: np.ndarray) -> str:
+    """Perceptual hash of a page as 64 hex characters"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    scale = min(1.0, HASH_WORK_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    gray = gray.astype(np.float32)
+
+    # Frame the ink (with margin) so where the scanner placed the page does not change the hash
+    cx, cy, sx, sy = _ink_frame(gray)
+    fx, fy = HASH_SIDE / (2 * HASH_SPREAD * sx), HASH_SIDE / (2 * HASH_SPREAD * sy)
+    # Low-pass before sampling at sub-pixel offsets, so a one-pixel shift does not alias
+    blurred = cv2.GaussianBlur(gray, (0, 0), sigmaX=0.5 / fx, sigmaY=0.5 / fy)
+    frame = np.float32([[fx, 0, HASH_SIDE / 2 - cx * fx], [0, fy, HASH_SIDE / 2 - cy * fy]])
+    thumb = cv2.warpAffine(blurred, frame, (HASH_SIDE, HASH_SIDE), flags=cv2.INTER_LINEAR,
+                           borderMode=cv2.BORDER_CONSTANT, borderValue=float(np.percentile(gray, 90)))
+
+    block = cv2.dct(thumb)[:HASH_BLOCK, :HASH_BLOCK].reshape(-1)
+    # The DC term only carries overall brightness
+    bits = block > np.median(block[1:])
+    bits[0] = False
+    return np.packbits(bits).tobytes().hex()
+
+def _hash_words(phash: str) -> np.ndarray:
+    return np.frombuffer(bytes.fromhex(phash), dtype='>u8').astype(np.uint64)
+
+def hamming_distance(a: str, b: str) -> int:
+    return int(np.bitwise_count(_hash_words(a) ^ _hash_words(b)).sum())
+
+def texts_match(text: str, stored_text: str, min_similarity: float = None) -> bool:
+    """Whether a page's OCR text agrees with a stored page's: every number identical, words nearly so"""
+    if min_similarity is None:
+        min_similarity = OCR_DEDUP_MIN_TEXT_SIMILARITY
+    words = re.findall(r'\w+', text.lower())
+    stored_words = re.findall(r'\w+', stored_text.lower())
+    if not words or not stored_words:
+        return False
+    # Dates, amounts and IDs are what differ between filled-in copies of a form
+    if [w for w in words if any(c.isdigit() for c in w)] != [w for w in stored_words if any(c.isdigit() for c in w)]:
+        return False
+    return difflib.SequenceMatcher(None, words, stored_words, autojunk=False).ratio() >= min_similarity
+
+class PageHashIndex:
+    """Perceptual hashes of one tenant's processed pages, searchable by Hamming distance"""
+
+    def __init__(self):
+        self.hashes = np.zeros((0, HASH_WORDS), np.uint64)
+        self.page_ids = np.zeros(0, np.int64)
+        self.max_page_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.page_ids)
+
+    def add_many(self, entries: List[Tuple[int, str]]):
+        """Add (page id, perceptual hash) entries"""
+        entries = [entry for entry in entries if entry[1]]
+        if not entries:
+            return
+        hashes = np.stack([_hash_words(phash) for _, phash in entries])
+        page_ids = np.array([page_id for page_id, _ in entries], np.int64)
+        with self._lock:
+            # New arrays rather than in-place growth, so readers never see a half-built index
+            self.hashes = np.concatenate([self.hashes, hashes])
+            self.page_ids = np.concatenate([self.page_ids, page_ids])
+            self.max_page_id = max(self.max_page_id, int(page_ids.max()))
+
+    def add(self, page_id: int, phash: Optional[str]):
+        self.add_many([(page_id, phash)])
+
+    def remove(self, page_ids: List[int]):
+        """Drop deleted pages so they are never matched again"""
+        with self._lock:
+            keep = ~np.isin(self.page_ids, np.asarray(list(page_ids), np.int64))
+            self.hashes = self.hashes[keep]
+            self.page_ids = self.page_ids[keep]
+
+    def nearest(self, phash: str, max_distance: int) -> Optional[Tuple[int, int]]:
+        """(page id, distance) of the closest stored page within max_distance"""
+        hashes, page_ids = self.hashes, self.page_ids
+        if not len(page_ids):
+            return None
+        distances = np.bitwise_count(hashes ^ _hash_words(phash)).sum(axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None
+        return int(page_ids[best]), int(distances[best])
+
+    def __getstate__(self):
+        # Page workers only need the arrays
+        return self.hashes, self.page_ids, self.max_page_id
+
+    def __setstate__(self, state):
+        self.hashes, self.page_ids, self.max_page_id = state
+        self._lock = threading.Lock()
+
+_indexes: Dict[int, PageHashIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_page_index(db, tenant_id: int) -> PageHashIndex:
+    """The tenant's index, topped up with pages stored since it was last read"""
+    from models import Document, DocumentPage
+
+    with _indexes_lock:
+        index = _indexes.setdefault(tenant_id, PageHashIndex())
+    # Other processes (API, Celery workers) add pages too, so pick up anything newer
+    rows = db.query(DocumentPage.id, DocumentPage.phash).join(Document).filter(
+        Document.tenant_id == tenant_id,
+        DocumentPage.phash.isnot(None),
+        DocumentPage.id > index.max_page_id
+    ).all()
+    index.add_many([(row.id, row.phash) for row in rows])
+    return index
+
+def evict_pages(page_ids: List[int]):
+    """Remove pages from every index held by this process"""
+    if not page_ids:
+        return
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.remove(page_ids)
+
+def release_pages(db, page_ids: List[int]):
+    """Unlink pages about to be deleted: clear references to them and evict them from the index"""
+    from models import DocumentPage
+
+    if not page_ids:
+        return
+    # SQLite only enforces ON DELETE SET NULL with foreign keys switched on, so clear them here
+    db.query(DocumentPage).filter(DocumentPage.duplicate_of_page_id.in_(page_ids)).update(
+        {DocumentPage.duplicate_of_page_id: None}, synchronize_session=False)
+    evict_pages(page_ids)
+
+def load_stored_page(db, page_id: int) -> Optional[Dict]:
+    """The stored OCR of an indexed page as page result fields (None if it has been deleted)"""
+    from models import DocumentPage, OCRResult
+    from ocr_boxes import BoxArray
+
+    source = db.query(DocumentPage).filter(DocumentPage.id == page_id).first()
+    ocr_record = db.query(OCRResult).filter(OCRResult.page_id == source.id).first() if source else None
+    if not ocr_record:
+        # Deleted by another process since the index last saw it
+        evict_pages([page_id])
+        return None
+
+    best_result = {
+        'engine': ocr_record.ocr_engine,
+        'text': ocr_record.extracted_text or '',
+        'confidence': ocr_record.confidence_score or 0.0,
+        'bounding_boxes': BoxArray.from_any(ocr_record.bounding_boxes),
+        'processing_time': 0.0
+    }
+    stored = {
+        'content_hash': source.content_hash,
+        'quality_score': source.quality_score,
+        'best_result': best_result,
+        'all_results': [best_result],
+        'engines_used': [ocr_record.ocr_engine]
+    }
+    if source.width and source.height:
+        # The reused boxes are in the matched page's pixel space, which may differ from this render
+        stored['page_size'] = (source.width, source.height)
+    return stored
+
+def find_duplicate_document(db, document, page_results: List[Dict]):
+    """The completed document every page is an exact copy of, if there is exactly one with the same schema"""
+    from models import Document, DocumentPage, DocumentStatus
+
+    # A text check tolerates OCR noise, so only identical pixels justify copying extracted fields
+    if not page_results or any(p['routing_mode'] != 'duplicate' or p.get('duplicate_check') != 'exact'
+                               for p in page_results):
+        return None
+    source_ids = {p['duplicate_of'] for p in page_results}
+    document_ids = {row.document_id for row in
+                    db.query(DocumentPage.document_id).filter(DocumentPage.id.in_(source_ids)).all()}
+    if len(document_ids) != 1:
+        return None
+    source = db.query(Document).filter(Document.id == document_ids.pop()).first()
+    if (source is None or source.id == document.id or source.status != DocumentStatus.COMPLETED
+            or source.form_schema_id != document.form_schema_id or source.num_pages != len(page_results)):
+        return None
+    return source
+
+def copy_extraction(db, source, document, first_page_id: Optional[int] = None) -> int:
+    """Copy a duplicate document's extracted field values (and LLM output) instead of re-running the LLM"""
+    from models import DocumentPage, FieldValue, LLMResult
+
+    copied = 0
+    for value in db.query(FieldValue).filter(FieldValue.document_id == source.id).all():
+        db.add(FieldValue(
+            document_id=document.id,
+            field_id=value.field_id,
+            extracted_value=value.extracted_value,
+            normalized_value=value.normalized_value,
+            confidence_score=value.confidence_score,
+            needs_review=value.needs_review,
+            validation_errors=value.validation_errors
+        ))
+        copied += 1
+
+    if first_page_id is not None:
+        source_page_ids = [row.id for row in
+                           db.query(DocumentPage.id).filter(DocumentPage.document_id == source.id).all()]
+        for record in db.query(LLMResult).filter(LLMResult.page_id.in_(source_page_ids)).all():
+            db.add(LLMResult(
+                page_id=first_page_id,
+                llm_model=record.llm_model,
+                input_text=record.input_text,
+                normalized_output=record.normalized_output,
+                confidence_score=record.confidence_score,
+                processing_time=0.0
+            ))
+
+    document.overall_confidence = source.overall_confidence
+    return copied
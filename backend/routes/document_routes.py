@@ -1,11 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database import get_db
-from models import User, Document, DocumentPage, FormSchema, FormField, FieldValue, DocumentStatus, ProcessingLog
+from models import User, Document, DocumentPage, FormSchema, FormField, FieldValue, DocumentStatus, ProcessingLog, OCRResult
 from schemas import DocumentUploadResponse, DocumentResponse
 from auth import get_current_user
+from ocr_boxes import BoxArray
+from image_io import sniff, normalize_image, pdf_page_count
+from ocr_spatial import QUERY_MODES, get_spatial_cache, region_rect
+from ocr_layout import layout_text
+from document_pages import delete_document_pages
 import os
+import time
 import uuid
 from datetime import datetime
 import aiofiles
@@ -16,6 +23,9 @@ router = APIRouter(prefix="/api/documents", tags=["Documents"])
 UPLOAD_DIR = "/app/uploads"
 Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
+# Rasters above this many pixels (largest page) are scaled down once at upload (0: keep as uploaded)
+UPLOAD_MAX_PIXELS = int(os.getenv('UPLOAD_MAX_PIXELS', str(40_000_000)))
+
 @router.post("/upload", response_model=DocumentUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
     file: UploadFile = File(...),
@@ -23,14 +33,6 @@ async def upload_document(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Validate file type
-    allowed_types = ['application/pdf', 'image/jpeg', 'image/png', 'image/jpg']
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File type not supported. Only PDF, JPEG, PNG allowed."
-        )
-    
     # Validate schema if provided
     if form_schema_id:
         schema = db.query(FormSchema).filter(
@@ -43,17 +45,40 @@ async def upload_document(
                 detail="Form schema not found"
             )
     
-    # Generate unique filename
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
+    content = await file.read()
+    
+    # Validate file type from the file's own header, not the client's content type
+    info = sniff(content)
+    if info is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File type not supported. Only PDF, JPEG, PNG, TIFF allowed."
+        )
+    
+    # Generate unique filename; the extension follows the detected format
+    unique_filename = f"{uuid.uuid4()}{info['extension']}"
     file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
     # Save file
     async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
         await f.write(content)
+    del content
+    
+    try:
+        if info['format'] == 'pdf':
+            # Page count from the page tree; nothing is rendered
+            info['num_pages'] = await run_in_threadpool(pdf_page_count, file_path)
+        else:
+            # Bound every later stage's input: decode and scale oversized rasters once, here
+            info = await run_in_threadpool(normalize_image, file_path, info, UPLOAD_MAX_PIXELS)
+    except Exception as e:
+        os.remove(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not read {info['format'].upper()} file: {str(e)}"
+        )
     
-    file_size = len(content)
+    file_size = os.path.getsize(file_path)
     
     # Create document record
     document = Document(
@@ -63,8 +88,8 @@ async def upload_document(
         original_filename=file.filename,
         file_path=file_path,
         file_size=file_size,
-        mime_type=file.content_type,
-        num_pages=1,  # Will be updated by processing
+        mime_type=info['mime_type'],
+        num_pages=info['num_pages'],
         status=DocumentStatus.UPLOADED
     )
     db.add(document)
@@ -76,6 +101,13 @@ async def upload_document(
         document_id=document.id,
         stage="upload",
         message=f"Document uploaded: {file.filename}",
+        log_metadata={
+            'format': info['format'],
+            'width': info['width'],
+            'height': info['height'],
+            'num_pages': info['num_pages'],
+            'original_size': info.get('original_size')
+        },
         level="INFO"
     )
     db.add(log)
@@ -126,8 +158,7 @@ def process_document_sync(
 ):
     """Process a document synchronously"""
     # Import here to avoid circular imports
-    from ocr_engines import OCREngine
-    from llm_processor import LLMProcessor
+    from engine_registry import get_ocr_engine, get_llm_processor
     from datetime import datetime, timezone
     
     # Get document and verify ownership
@@ -159,9 +190,9 @@ def process_document_sync(
         db.add(log)
         db.commit()
         
-        # Initialize processors
-        ocr_engine = OCREngine()
-        llm_processor = LLMProcessor()
+        # Shared processors (models are loaded once per process)
+        ocr_engine = get_ocr_engine()
+        llm_processor = get_llm_processor()
         
         # Run OCR
         log = ProcessingLog(
@@ -173,20 +204,122 @@ def process_document_sync(
         db.add(log)
         db.commit()
         
-        ocr_result = ocr_engine.process_with_routing(document.file_path)
-        best_ocr = ocr_result['best_result']
+        # Drop pages left over from a previous run
+        delete_document_pages(db, document_id)
+        db.commit()
+        
+        # Per-schema confidence gate for cascade routing and field regions for ROI OCR
+        confidence_threshold = None
+        regions_by_page = {}
+        if document.form_schema_id:
+            schema = db.query(FormSchema).filter(FormSchema.id == document.form_schema_id).first()
+            if schema:
+                confidence_threshold = schema.ocr_confidence_threshold
+                for f in db.query(FormField).filter(FormField.schema_id == schema.id).all():
+                    if f.region:
+                        regions_by_page.setdefault(f.region.get('page', 1), {})[f.field_name] = f.region
+        
+        # Tenant's OCR engine trade-off (SystemConfig ocr_routing / ocr_routing.tenant.<id>)
+        from ocr_router import get_routing_policy
+        routing_policy = get_routing_policy(db, document.tenant_id)
+        
+        # Perceptual hashes of the tenant's processed pages, for near-duplicate reuse
+        from page_dedup import get_page_index, load_stored_page, find_duplicate_document, copy_extraction
+        page_index = get_page_index(db, document.tenant_id) if routing_policy['dedup'] != 'off' else None
+        
+        # OCR pages one at a time, persisting each as it completes
+        page_results = []
+        first_page = None
+        for page_result in ocr_engine.iter_process_document(
+            document.file_path,
+            confidence_threshold=confidence_threshold,
+            regions_by_page=regions_by_page,
+            policy=routing_policy,
+            page_index=page_index,
+            load_duplicate=lambda page_id: load_stored_page(db, page_id)
+        ):
+            best_page_ocr = page_result['best_result']
+            
+            width, height = page_result.get('page_size') or (None, None)
+            page = DocumentPage(
+                document_id=document.id,
+                page_number=page_result['page_number'],
+                image_path=page_result['image_path'],
+                preprocessed_path=page_result.get('preprocessed_path'),
+                quality_score=page_result['quality_score'],
+                width=width,
+                height=height,
+                phash=page_result.get('phash'),
+                content_hash=page_result.get('content_hash'),
+                duplicate_of_page_id=page_result.get('duplicate_of')
+            )
+            db.add(page)
+            db.flush()
+            if page_index is not None:
+                page_index.add(page.id, page.phash)
+            if first_page is None:
+                first_page = page
+            
+            ocr_record = OCRResult(
+                page_id=page.id,
+                ocr_engine=best_page_ocr['engine'],
+                extracted_text=best_page_ocr['text'],
+                confidence_score=best_page_ocr['confidence'],
+                bounding_boxes=BoxArray.from_any(best_page_ocr.get('bounding_boxes')).to_compact(),
+                processing_time=best_page_ocr['processing_time']
+            )
+            db.add(ocr_record)
+            
+            log = ProcessingLog(
+                document_id=document_id,
+                stage='ocr',
+                message=f'Page {page_result["page_number"]} OCR completed with {best_page_ocr["engine"]} (confidence: {best_page_ocr["confidence"]:.2f})',
+                log_metadata={
+                    'routing_mode': page_result['routing_mode'],
+                    'quality_band': page_result.get('quality_band'),
+                    'orientation': page_result.get('orientation'),
+                    'roi_fallback': page_result.get('roi_fallback', False),
+                    'engines_used': page_result['engines_used'],
+                    'cache_hits': page_result.get('cache_hits', 0),
+                    'duplicate_of_page_id': page_result.get('duplicate_of'),
+                    'duplicate_distance': page_result.get('duplicate_distance'),
+                    'duplicate_check': page_result.get('duplicate_check')
+                },
+                level='INFO'
+            )
+            db.add(log)
+            db.commit()
+            
+            page_results.append(page_result)
+        
+        ocr_result = ocr_engine.combine_page_results(page_results)
+        document.num_pages = ocr_result['num_pages']
         
         log = ProcessingLog(
             document_id=document_id,
             stage='ocr',
-            message=f'OCR completed with {best_ocr["engine"]} (confidence: {best_ocr["confidence"]:.2f})',
+            message=f'OCR completed for {ocr_result["num_pages"]} page(s) (confidence: {ocr_result["confidence"]:.2f})',
             level='INFO'
         )
         db.add(log)
         db.commit()
         
+        # Resubmission of a completed document: take its extracted fields instead of calling the LLM
+        duplicate_document = find_duplicate_document(db, document, page_results) if document.form_schema_id else None
+        if duplicate_document is not None:
+            copied = copy_extraction(db, duplicate_document, document, first_page.id)
+            log = ProcessingLog(
+                document_id=document_id,
+                stage='llm',
+                message=f'Duplicate of document {duplicate_document.id}: reused {copied} extracted field(s), LLM skipped',
+                log_metadata={'duplicate_of_document_id': duplicate_document.id},
+                level='INFO'
+            )
+            db.add(log)
+            db.commit()
+        
         # Process with LLM if schema exists
-        if document.form_schema_id:
+        elif document.form_schema_id:
             # Get form fields
             fields = db.query(FormField).filter(FormField.schema_id == document.form_schema_id).all()
             
@@ -213,9 +346,9 @@ def process_document_sync(
                 # Process with LLM
                 llm_result = llm_processor.process_with_model(
                     'gpt-4o',
-                    best_ocr['text'],
+                    ocr_result['text'],
                     field_dicts,
-                    ocr_confidence=best_ocr['confidence']
+                    ocr_confidence=ocr_result['confidence']
                 )
                 
                 log = ProcessingLog(
@@ -264,7 +397,7 @@ def process_document_sync(
                 
                 document.overall_confidence = llm_result['overall_confidence']
         else:
-            document.overall_confidence = best_ocr['confidence']
+            document.overall_confidence = ocr_result['confidence']
         
         # Update document status
         document.status = DocumentStatus.COMPLETED
@@ -376,6 +509,9 @@ async def delete_document(
     if os.path.exists(document.file_path):
         os.remove(document.file_path)
     
+    # Also unlinks pages of other documents that point at this one's as their duplicate source
+    delete_document_pages(db, document.id)
+    
     db.delete(document)
     db.commit()
     
@@ -404,6 +540,189 @@ async def get_document_logs(
     
     return logs
 
+@router.get("/{document_id}/pages/{page_number}/ocr")
+async def get_page_ocr(
+    document_id: int,
+    page_number: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """OCR text and word/line boxes of one page"""
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.tenant_id == current_user.tenant_id
+    ).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    page = db.query(DocumentPage).filter(
+        DocumentPage.document_id == document_id,
+        DocumentPage.page_number == page_number
+    ).first()
+    ocr_record = db.query(OCRResult).filter(OCRResult.page_id == page.id).first() if page else None
+    if not ocr_record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No OCR result for this page"
+        )
+    
+    # Boxes are stored packed; expand to one JSON object per box only here
+    boxes = BoxArray.from_any(ocr_record.bounding_boxes)
+    return {
+        "document_id": document_id,
+        "page_number": page_number,
+        "ocr_engine": ocr_record.ocr_engine,
+        "text": ocr_record.extracted_text,
+        "confidence": ocr_record.confidence_score,
+        "duplicate_of_page_id": page.duplicate_of_page_id,
+        "width": page.width,
+        "height": page.height,
+        "box_count": len(boxes),
+        "bounding_boxes": boxes.to_dicts()
+    }
+
+def _page_spatial_index(db: Session, current_user: User, document_id: int, page_number: int):
+    """The page row and the cached spatial index over its stored OCR boxes"""
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.tenant_id == current_user.tenant_id
+    ).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    page = db.query(DocumentPage).filter(
+        DocumentPage.document_id == document_id,
+        DocumentPage.page_number == page_number
+    ).first()
+    ocr_row = db.query(OCRResult.id, OCRResult.created_at).filter(
+        OCRResult.page_id == page.id
+    ).first() if page else None
+    if not ocr_row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No OCR result for this page"
+        )
+    
+    def load_boxes():
+        # Only decoded on a cache miss
+        return BoxArray.from_any(db.query(OCRResult.bounding_boxes).filter(OCRResult.id == ocr_row.id).scalar())
+    
+    # Row ids can be reused after a reprocess, so the timestamp is part of the key
+    index = get_spatial_cache().get((ocr_row.id, ocr_row.created_at), load_boxes)
+    return document, page, index
+
+def _page_scale(page: DocumentPage, normalized: bool) -> tuple:
+    """Factors from query coordinates to page pixels"""
+    if not normalized:
+        return 1.0, 1.0
+    if not page.width or not page.height:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Page size unknown; reprocess the document to use normalized coordinates"
+        )
+    return page.width, page.height
+
+@router.get("/{document_id}/pages/{page_number}/ocr/region")
+async def get_page_ocr_region(
+    document_id: int,
+    page_number: int,
+    x1: Optional[float] = None,
+    y1: Optional[float] = None,
+    x2: Optional[float] = None,
+    y2: Optional[float] = None,
+    mode: str = 'intersects',
+    normalized: bool = False,
+    field: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """OCR boxes and text inside a rectangle, or inside a schema field's region"""
+    if mode not in QUERY_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"mode must be one of: {', '.join(QUERY_MODES)}"
+        )
+    
+    document, page, index = _page_spatial_index(db, current_user, document_id, page_number)
+    
+    if field is not None:
+        form_field = db.query(FormField).filter(
+            FormField.schema_id == document.form_schema_id,
+            FormField.field_name == field
+        ).first() if document.form_schema_id else None
+        if not form_field or not form_field.region:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Field has no region in this document's schema"
+            )
+        width, height = _page_scale(page, True)
+        rect = region_rect(form_field.region, width, height)
+    else:
+        if None in (x1, y1, x2, y2):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Give x1, y1, x2, y2 or a field name"
+            )
+        width, height = _page_scale(page, normalized)
+        rect = (x1 * width, y1 * height, x2 * width, y2 * height)
+    
+    start_time = time.perf_counter()
+    ids = index.query_region(*rect, mode=mode)
+    query_time = time.perf_counter() - start_time
+    
+    boxes = index.boxes.take(ids)
+    return {
+        "document_id": document_id,
+        "page_number": page_number,
+        "rect": [round(float(v), 1) for v in rect],
+        "mode": mode,
+        "text": layout_text(boxes),
+        "confidence": boxes.mean_confidence(),
+        "box_count": len(boxes),
+        "box_indices": ids.tolist(),
+        "bounding_boxes": boxes.to_dicts(),
+        "query_time_ms": round(query_time * 1000, 3)
+    }
+
+@router.get("/{document_id}/pages/{page_number}/ocr/point")
+async def get_page_ocr_point(
+    document_id: int,
+    page_number: int,
+    x: float,
+    y: float,
+    radius: float = 0.0,
+    normalized: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """OCR boxes at a point (or within radius pixels of it), nearest first"""
+    _, page, index = _page_spatial_index(db, current_user, document_id, page_number)
+    width, height = _page_scale(page, normalized)
+    
+    start_time = time.perf_counter()
+    ids = index.query_point(x * width, y * height, max(radius, 0.0))
+    query_time = time.perf_counter() - start_time
+    
+    boxes = index.boxes.take(ids)
+    return {
+        "document_id": document_id,
+        "page_number": page_number,
+        "point": [round(x * width, 1), round(y * height, 1)],
+        "radius": radius,
+        "box_count": len(boxes),
+        "box_indices": ids.tolist(),
+        "bounding_boxes": boxes.to_dicts(),
+        "query_time_ms": round(query_time * 1000, 3)
+    }
+
 @router.get("/{document_id}/fields")
 async def get_document_fields(
     document_id: int,
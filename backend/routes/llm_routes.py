@@ -3,8 +3,8 @@ from sqlalchemy.orm import Session
 from database import get_db
 from models import User
 from auth import get_current_user
+from ollama_client import get_ollama_client, OLLAMA_STATUS_TIMEOUT
 import os
-import requests
 import psutil
 import shutil
 
@@ -51,7 +51,7 @@ async def get_llm_status(
     
     # Check if Ollama is running and what models are available
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
+        response = await get_ollama_client().request('GET', '/api/tags', timeout=OLLAMA_STATUS_TIMEOUT)
         if response.status_code == 200:
             models = response.json().get('models', [])
             status_info["local_llm"]["installed_models"] = [
@@ -192,8 +192,10 @@ async def test_llm_connection(
     
     elif model_type == 'local':
         try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
+            response = await get_ollama_client().request(
+                'POST',
+                '/api/generate',
+                limited=True,
                 json={
                     "model": "qwen2.5:3b-instruct",
                     "prompt": "Say 'test successful'",
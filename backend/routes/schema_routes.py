@@ -19,6 +19,7 @@ async def create_schema(
         tenant_id=current_user.tenant_id,
         name=schema_data.name,
         description=schema_data.description,
+        ocr_confidence_threshold=schema_data.ocr_confidence_threshold,
         created_by=current_user.id,
         version=1,
         is_active=True
@@ -40,7 +41,8 @@ async def create_schema(
             dropdown_options=field_data.dropdown_options,
             cross_field_rules=field_data.cross_field_rules,
             field_group=field_data.field_group,
-            display_order=field_data.display_order
+            display_order=field_data.display_order,
+            region=field_data.region.model_dump() if field_data.region else None
         )
         db.add(field)
     
@@ -125,6 +127,8 @@ async def update_schema(
         schema.description = schema_update.description
     if schema_update.is_active is not None:
         schema.is_active = schema_update.is_active
+    if schema_update.ocr_confidence_threshold is not None:
+        schema.ocr_confidence_threshold = schema_update.ocr_confidence_threshold
     
     db.commit()
     db.refresh(schema)
@@ -188,7 +192,8 @@ async def add_field_to_schema(
         dropdown_options=field_data.dropdown_options,
         cross_field_rules=field_data.cross_field_rules,
         field_group=field_data.field_group,
-        display_order=field_data.display_order
+        display_order=field_data.display_order,
+        region=field_data.region.model_dump() if field_data.region else None
     )
     db.add(field)
     
@@ -100,6 +100,14 @@ class SubscriptionResponse(BaseModel):
         from_attributes = True
 
 # Form Schema Schemas
+class FieldRegion(BaseModel):
+    # Fractions of page width/height, origin top-left
+    x: float = Field(..., ge=0, le=1)
+    y: float = Field(..., ge=0, le=1)
+    width: float = Field(..., gt=0, le=1)
+    height: float = Field(..., gt=0, le=1)
+    page: int = Field(1, ge=1)
+
 class FormFieldCreate(BaseModel):
     field_name: str
     field_label: str
@@ -111,6 +119,7 @@ class FormFieldCreate(BaseModel):
     cross_field_rules: Optional[Dict[str, Any]] = None
     field_group: Optional[str] = None
     display_order: int = 0
+    region: Optional[FieldRegion] = None
 
 class FormFieldResponse(FormFieldCreate):
     id: int
@@ -123,12 +132,14 @@ class FormFieldResponse(FormFieldCreate):
 class FormSchemaCreate(BaseModel):
     name: str
     description: Optional[str] = None
+    ocr_confidence_threshold: Optional[float] = Field(None, ge=0, le=1)
     fields: List[FormFieldCreate]
 
 class FormSchemaUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     is_active: Optional[bool] = None
+    ocr_confidence_threshold: Optional[float] = Field(None, ge=0, le=1)
 
 class FormSchemaResponse(BaseModel):
     id: int
@@ -137,6 +148,7 @@ class FormSchemaResponse(BaseModel):
     description: Optional[str]
     version: int
     is_active: bool
+    ocr_confidence_threshold: Optional[float] = None
     created_at: datetime
     fields: List[FormFieldResponse]
     
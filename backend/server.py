@@ -19,9 +19,18 @@ async def lifespan(app: FastAPI):
     # Startup
     print("Starting OCR Engine API...")
     print("Database tables already created via init_db.py")
+    from engine_registry import OCR_WARMUP_ON_STARTUP, warm_up
+    if OCR_WARMUP_ON_STARTUP:
+        print("Loading OCR/LLM engines...")
+        engine_status = warm_up()
+        print(f"Engines ready: {engine_status['ready']}")
     yield
     # Shutdown
     print("Shutting down OCR Engine API...")
+    from ocr_engines import shutdown_page_pool
+    shutdown_page_pool()
+    from ollama_client import close_ollama_client
+    close_ollama_client()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -54,10 +63,12 @@ async def global_exception_handler(request: Request, exc: Exception):
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
+    from engine_registry import get_engine_status
     return {
         "status": "healthy",
         "service": "OCR Engine API",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "engines": get_engine_status()
     }
 
 # Root endpoint
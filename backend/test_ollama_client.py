@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled Ollama client, run against a local stub server
+(no Ollama needed): python test_ollama_client.py
+"""
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ollama_client import OllamaClient
+
+GENERATE_DELAY = 0.2
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Minimal /api/tags and /api/generate; model 'broken' fails, model 'slow' hangs"""
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so connection reuse is visible
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        state = self.server.state
+        with state.lock:
+            state.connections.add(self.client_address)
+        if self.path == '/api/tags':
+            self._reply(200, {'models': [{'name': 'stub:latest'}]})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        state = self.server.state
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with state.lock:
+            state.connections.add(self.client_address)
+            state.in_flight += 1
+            state.peak_in_flight = max(state.peak_in_flight, state.in_flight)
+        try:
+            if body['model'] == 'broken':
+                self._reply(500, {'error': 'model failed'})
+                return
+            time.sleep(5 if body['model'] == 'slow' else GENERATE_DELAY)
+            self._reply(200, {'model': body['model'], 'response': json.dumps({'echo': body['prompt']}),
+                              'options': body.get('options')})
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def print_section(title):
+    print(f"\n{'='*60}")
+    print(f"  {title}")
+    print(f"{'='*60}")
+
+def make_client(server, **kwargs) -> OllamaClient:
+    host, port = server.server_address
+    return OllamaClient(base_url=f"http://{host}:{port}", **kwargs)
+
+def test_sequential_calls_reuse_connection():
+    print_section("Testing Connection Reuse")
+    server = start_stub()
+    client = make_client(server, concurrency=2)
+    try:
+        assert client.list_models_sync()[0]['name'] == 'stub:latest'
+        for i in range(3):
+            result = client.generate_sync('stub', f'prompt {i}', format='json', options={'num_ctx': 4096})
+            assert json.loads(result['response']) == {'echo': f'prompt {i}'}
+            assert result['options'] == {'num_ctx': 4096}
+        print(f"Connections opened: {len(server.state.connections)}")
+        assert len(server.state.connections) == 1
+        print("✓ Sequential calls share one keep-alive connection")
+    finally:
+        client.close()
+        server.shutdown()
+
+def test_concurrency_cap():
+    print_section("Testing Generation Concurrency Cap")
+    server = start_stub()
+    client = make_client(server, concurrency=2)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda i: client.generate_sync('stub', f'doc {i}'), range(8)))
+        assert len(results) == 8
+        print(f"Peak generations in flight: {server.state.peak_in_flight}")
+        assert server.state.peak_in_flight == 2
+        assert client.stats()['queued'] == 0 and client.stats()['in_flight'] == 0
+        print("✓ Eight concurrent callers never exceed the configured two")
+    finally:
+        client.close()
+        server.shutdown()
+
+def test_async_callers():
+    print_section("Testing Async Callers On Another Loop")
+    server = start_stub()
+    client = make_client(server, concurrency=2)
+
+    async def run():
+        models = await client.list_models()
+        results = await asyncio.gather(*(client.generate('stub', f'async {i}') for i in range(4)))
+        return models, results
+
+    try:
+        models, results = asyncio.run(run())
+        assert models[0]['name'] == 'stub:latest'
+        assert [json.loads(r['response'])['echo'] for r in results] == [f'async {i}' for i in range(4)]
+        print("✓ Async callers share the client from their own event loop")
+    finally:
+        client.close()
+        server.shutdown()
+
+def test_errors_and_timeouts():
+    print_section("Testing Errors And Timeouts")
+    server = start_stub()
+    client = make_client(server, concurrency=2)
+    try:
+        try:
+            client.generate_sync('broken', 'x')
+            raise AssertionError("HTTP error was not raised")
+        except Exception as e:
+            assert 'Ollama error 500' in str(e), e
+        print("✓ Server errors surface as exceptions")
+
+        start = time.time()
+        try:
+            client.generate_sync('slow', 'x', timeout=0.5)
+            raise AssertionError("Timeout was not raised")
+        except AssertionError:
+            raise
+        except Exception as e:
+            print(f"Timed out after {time.time() - start:.2f}s: {type(e).__name__}")
+        assert time.time() - start < 2
+        assert client.stats()['errors'] >= 1
+        print("✓ Timeouts surface as exceptions")
+
+        # The pool keeps working after a failure
+        assert client.generate_sync('stub', 'after')['model'] == 'stub'
+
+        unreachable = OllamaClient(base_url='http://127.0.0.1:9', connect_timeout=0.5)
+        try:
+            unreachable.list_models_sync()
+            raise AssertionError("Connection error was not raised")
+        except AssertionError:
+            raise
+        except Exception:
+            print("✓ Unreachable server surfaces as an exception")
+        finally:
+            unreachable.close()
+    finally:
+        client.close()
+        server.shutdown()
+
+def main():
+    print("\n" + "="*60)
+    print("  OLLAMA CLIENT TESTING (stub server)")
+    print("="*60)
+
+    try:
+        test_sequential_calls_reuse_connection()
+        test_concurrency_cap()
+        test_async_callers()
+        test_errors_and_timeouts()
+
+        print_section("ALL TESTS PASSED ✓")
+
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
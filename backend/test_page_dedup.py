@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for near-duplicate page hashing on synthetic pages
+(no OCR engines needed): python test_page_dedup.py
+"""
+import cv2
+import numpy as np
+from page_dedup import PageHashIndex, page_hash, hamming_distance
+from ocr_router import OCR_DEDUP_MAX_DISTANCE
+
+PAGE_WIDTH, PAGE_HEIGHT = 1700, 2200  # Letter at 200 DPI
+
+FIRST_COPY = ["John Smith", "1980-04-12", "12345678", "$1,200.00", "12 High St", "J Smith"]
+SECOND_COPY = ["Maria Garcia-Lopez", "1975-11-30", "98765432", "$87.50", "4 Elm Road Apt 9", "MGL"]
+
+def form_page(values, dense: bool = False) -> np.ndarray:
+    """A form with labels, thin rules and filled-in values (sparse: mostly white paper)"""
+    img = np.full((PAGE_HEIGHT, PAGE_WIDTH), 255, np.uint8)
+    cv2.putText(img, "APPLICATION FORM", (300, 220), cv2.FONT_HERSHEY_SIMPLEX, 2.2, 0, 5)
+    labels = ["Name", "Date of birth", "Account number", "Amount", "Address", "Signature"]
+    for i in range(30 if dense else len(labels)):
+        y = 400 + i * (55 if dense else 180)
+        cv2.putText(img, labels[i % len(labels)] + ":", (150, y), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2)
+        cv2.line(img, (650, y + 10), (1550, y + 10), 0, 2)
+        cv2.putText(img, values[i % len(values)], (670, y), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2)
+    return img
+
+def rescan(img: np.ndarray, dx: float, dy: float, rng) -> np.ndarray:
+    """The same page placed elsewhere on the scanner bed, with sensor noise and JPEG compression"""
+    shift = np.float32([[1, 0, dx], [0, 1, dy]])
+    out = cv2.warpAffine(img, shift, (img.shape[1], img.shape[0]), borderValue=255)
+    out = np.clip(out.astype(np.float32) + rng.normal(0, 5, out.shape), 0, 255).astype(np.uint8)
+    _, encoded = cv2.imencode('.jpg', out, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+
+def print_section(title):
+    print(f"\n{'='*60}")
+    print(f"  {title}")
+    print(f"{'='*60}")
+
+def test_shifted_copies_match():
+    print_section("Testing Shifted Re-scans")
+    rng = np.random.default_rng(0)
+    shifts = [(0, 2), (0, -3), (7, 0), (-5, 4), (1, 1), (15, 20), (40, -30)]
+    for dense in (False, True):
+        page = form_page(FIRST_COPY, dense)
+        phash = page_hash(page)
+        distances = [hamming_distance(phash, page_hash(rescan(page, dx, dy, rng))) for dx, dy in shifts]
+        print(f"{'Dense' if dense else 'Sparse'} page, distances after shifts {shifts}: {distances}")
+        assert max(distances) <= OCR_DEDUP_MAX_DISTANCE, distances
+    print(f"✓ Shifted copies stay within {OCR_DEDUP_MAX_DISTANCE} bits")
+
+def test_different_fill_does_not_match():
+    print_section("Testing Differently Filled Copies")
+    rng = np.random.default_rng(1)
+    for dense in (False, True):
+        first = page_hash(form_page(FIRST_COPY, dense))
+        second = page_hash(rescan(form_page(SECOND_COPY, dense), 3, 2, rng))
+        distance = hamming_distance(first, second)
+        print(f"{'Dense' if dense else 'Sparse'} form filled in differently: {distance} bits")
+        assert distance > OCR_DEDUP_MAX_DISTANCE, distance
+    print("✓ Another filled-in copy of the form is not a near-duplicate")
+
+def test_index_lookup():
+    print_section("Testing Page Hash Index")
+    rng = np.random.default_rng(2)
+    index = PageHashIndex()
+    index.add(1, page_hash(form_page(FIRST_COPY)))
+    index.add(2, page_hash(form_page(SECOND_COPY, dense=True)))
+
+    match = index.nearest(page_hash(rescan(form_page(FIRST_COPY), -6, 9, rng)), OCR_DEDUP_MAX_DISTANCE)
+    assert match is not None and match[0] == 1, match
+
+    index.remove([1])
+    assert index.nearest(page_hash(form_page(FIRST_COPY)), OCR_DEDUP_MAX_DISTANCE) is None
+    assert len(index) == 1
+    print("✓ Shifted copy found; removed pages are no longer matched")
+
+def main():
+    print("\n" + "="*60)
+    print("  PAGE DEDUP TESTING (synthetic pages)")
+    print("="*60)
+
+    try:
+        test_shifted_copies_match()
+        test_different_fill_does_not_match()
+        test_index_lookup()
+
+        print_section("ALL TESTS PASSED ✓")
+
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
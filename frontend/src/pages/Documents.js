@@ -195,11 +195,11 @@ function Documents({ user, onLogout }) {
               <input
                 type="file"
                 onChange={handleFileChange}
-                accept=".pdf,.jpg,.jpeg,.png"
+                accept=".pdf,.jpg,.jpeg,.png,.tif,.tiff"
                 className="w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-primary-500 focus:border-transparent outline-none"
                 data-testid="file-input"
               />
-              <p className="mt-1 text-sm text-gray-500">Accepted: PDF, JPG, PNG</p>
+              <p className="mt-1 text-sm text-gray-500">Accepted: PDF, JPG, PNG, TIFF</p>
             </div>
             <div>
               <label className="block text-sm font-medium text-gray-700 mb-2">
@@ -1,16 +1,23 @@
 from celery_app import celery_app
+from celery.signals import worker_process_init
 from sqlalchemy.orm import Session
 import sys
 sys.path.append('/app/backend')
 
 from database import SessionLocal
 from models import Document, DocumentPage, OCRResult, LLMResult, FieldValue, ProcessingLog, FormField, DocumentStatus
-from ocr_engines import OCREngine
-from llm_processor import LLMProcessor
+from engine_registry import get_ocr_engine, get_llm_processor, warm_up, OCR_WARMUP_ON_STARTUP
+from ocr_router import get_routing_policy
+from ocr_boxes import BoxArray
+from page_dedup import get_page_index, load_stored_page, find_duplicate_document, copy_extraction
+from document_pages import delete_document_pages
 from datetime import datetime, timezone
 
-ocr_engine = OCREngine()
-llm_processor = LLMProcessor()
+@worker_process_init.connect
+def warm_up_engines(**kwargs):
+    """Load models once when each worker process starts"""
+    if OCR_WARMUP_ON_STARTUP:
+        warm_up()
 
 def get_db():
     db = SessionLocal()
@@ -23,6 +30,8 @@ def get_db():
 def process_document(document_id: int):
     """Main document processing task"""
     db = SessionLocal()
+    ocr_engine = get_ocr_engine()
+    llm_processor = get_llm_processor()
     
     try:
         # Get document
@@ -45,44 +54,97 @@ def process_document(document_id: int):
         document.processing_started_at = datetime.now(timezone.utc)
         db.commit()
         
-        # Step 1: OCR Processing
-        ocr_result = ocr_engine.process_with_routing(document.file_path)
-        
-        # Create document page
-        page = DocumentPage(
-            document_id=document.id,
-            page_number=1,
-            image_path=document.file_path,
-            quality_score=ocr_result['quality_score']
-        )
-        db.add(page)
+        # Drop pages left over from a previous run
+        delete_document_pages(db, document.id)
         db.commit()
-        db.refresh(page)
         
-        # Save OCR results
-        best_ocr = ocr_result['best_result']
-        ocr_record = OCRResult(
-            page_id=page.id,
-            ocr_engine=best_ocr['engine'],
-            extracted_text=best_ocr['text'],
-            confidence_score=best_ocr['confidence'],
-            bounding_boxes=best_ocr.get('bounding_boxes', []),
-            processing_time=best_ocr['processing_time']
-        )
-        db.add(ocr_record)
-        db.commit()
+        # Step 1: OCR Processing, one page at a time
+        confidence_threshold = None
+        regions_by_page = {}
+        if document.form_schema:
+            confidence_threshold = document.form_schema.ocr_confidence_threshold
+            for f in document.form_schema.fields:
+                if f.region:
+                    regions_by_page.setdefault(f.region.get('page', 1), {})[f.field_name] = f.region
+        
+        routing_policy = get_routing_policy(db, document.tenant_id)
+        page_index = get_page_index(db, document.tenant_id) if routing_policy['dedup'] != 'off' else None
+        
+        page_results = []
+        first_page = None
+        for page_result in ocr_engine.iter_process_document(
+            document.file_path,
+            confidence_threshold=confidence_threshold,
+            regions_by_page=regions_by_page,
+            policy=routing_policy,
+            page_index=page_index,
+            load_duplicate=lambda page_id: load_stored_page(db, page_id)
+        ):
+            # Create document page
+            width, height = page_result.get('page_size') or (None, None)
+            page = DocumentPage(
+                document_id=document.id,
+                page_number=page_result['page_number'],
+                image_path=page_result['image_path'],
+                preprocessed_path=page_result.get('preprocessed_path'),
+                quality_score=page_result['quality_score'],
+                width=width,
+                height=height,
+                phash=page_result.get('phash'),
+                content_hash=page_result.get('content_hash'),
+                duplicate_of_page_id=page_result.get('duplicate_of')
+            )
+            db.add(page)
+            db.commit()
+            db.refresh(page)
+            if page_index is not None:
+                page_index.add(page.id, page.phash)
+            if first_page is None:
+                first_page = page
+            
+            # Save OCR results
+            best_page_ocr = page_result['best_result']
+            ocr_record = OCRResult(
+                page_id=page.id,
+                ocr_engine=best_page_ocr['engine'],
+                extracted_text=best_page_ocr['text'],
+                confidence_score=best_page_ocr['confidence'],
+                bounding_boxes=BoxArray.from_any(best_page_ocr.get('bounding_boxes')).to_compact(),
+                processing_time=best_page_ocr['processing_time']
+            )
+            db.add(ocr_record)
+            db.commit()
+            
+            page_results.append(page_result)
+        
+        ocr_result = ocr_engine.combine_page_results(page_results)
+        document.num_pages = ocr_result['num_pages']
         
         log = ProcessingLog(
             document_id=document.id,
             stage='ocr',
-            message=f"OCR completed with {best_ocr['engine']} (confidence: {best_ocr['confidence']:.2f})",
+            message=f"OCR completed for {ocr_result['num_pages']} page(s) (confidence: {ocr_result['confidence']:.2f})",
             level='INFO'
         )
         db.add(log)
         db.commit()
         
-        # Step 2: LLM Processing (if schema exists)
-        if document.form_schema_id:
+        # Step 2: LLM Processing (if schema exists), unless this resubmits a completed document
+        duplicate_document = find_duplicate_document(db, document, page_results) if document.form_schema_id else None
+        if duplicate_document is not None:
+            copied = copy_extraction(db, duplicate_document, document, first_page.id)
+            db.commit()
+            
+            log = ProcessingLog(
+                document_id=document.id,
+                stage='llm',
+                message=f"Duplicate of document {duplicate_document.id}: reused {copied} extracted field(s), LLM skipped",
+                log_metadata={'duplicate_of_document_id': duplicate_document.id},
+                level='INFO'
+            )
+            db.add(log)
+            db.commit()
+        elif document.form_schema_id:
             from models import FormSchema
             schema = db.query(FormSchema).filter(FormSchema.id == document.form_schema_id).first()
             
@@ -101,16 +163,16 @@ def process_document(document_id: int):
                 # Process with LLM (cloud or local)
                 llm_result = llm_processor.process_with_model(
                     'gpt-4o',  # Will auto-route to mini or full based on complexity
-                    best_ocr['text'],
+                    ocr_result['text'],
                     field_dicts,
-                    ocr_confidence=best_ocr['confidence']
+                    ocr_confidence=ocr_result['confidence']
                 )
                 
                 # Save LLM result
                 llm_record = LLMResult(
-                    page_id=page.id,
+                    page_id=first_page.id,
                     llm_model=llm_result['model'],
-                    input_text=best_ocr['text'][:1000],  # Truncate
+                    input_text=ocr_result['text'][:1000],  # Truncate
                     normalized_output=llm_result['extracted_fields'],
                     confidence_score=llm_result['overall_confidence'],
                     processing_time=llm_result['processing_time']
@@ -171,7 +233,7 @@ def process_document(document_id: int):
                 document.overall_confidence = llm_result['overall_confidence']
         else:
             # No schema, just use OCR confidence
-            document.overall_confidence = best_ocr['confidence']
+            document.overall_confidence = ocr_result['confidence']
         
         # Step 3: Finalize
         document.status = DocumentStatus.COMPLETED